@@ -0,0 +1,178 @@
+"""
+Admission control for the web app.
+
+Every upload is priced in projected compute seconds (audio duration times the
+model's recent real-time factor). Jobs are queued while the projected backlog
+stays under a limit and rejected with a retry hint beyond it. Waiting jobs are
+started round-robin across clients so one client cannot monopolize workers.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict
+
+# Conservative CPU real-time factors (processing seconds per audio second),
+# used until a model has been measured on this host.
+DEFAULT_RTF = {
+    "tiny": 0.1,
+    "base": 0.2,
+    "small": 0.6,
+    "medium": 1.5,
+    "large": 3.0,
+}
+RTF_SMOOTHING = 0.3
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job would push the projected backlog over the limit."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A job admitted to the queue."""
+
+    def __init__(self, client: str, model: str, duration: float, cost: float):
+        self.client = client
+        self.model = model
+        self.duration = duration
+        self.cost = cost
+        self.started = False
+        self.clock = 0.0
+
+    def restart_clock(self) -> None:
+        """Time the job's speed from now on, e.g. once its model is loaded."""
+        self.clock = time.perf_counter()
+
+
+class AdmissionController:
+    """
+    Bound the projected transcription backlog and share workers fairly.
+
+    Args:
+        max_backlog: Projected compute seconds (queued plus running) allowed
+        workers: Number of transcriptions allowed to run at once
+        max_client_jobs: Queued plus running jobs allowed per client
+    """
+
+    def __init__(self, max_backlog: float = 3600.0, workers: int = 1, max_client_jobs: int = 2):
+        self.max_backlog = max_backlog
+        self.workers = max(1, workers)
+        self.max_client_jobs = max_client_jobs
+        self._cond = threading.Condition()
+        self._rtf: Dict[str, float] = dict(DEFAULT_RTF)
+        self._waiting: Dict[str, Deque[Ticket]] = {}
+        self._rotation: Deque[str] = deque()
+        self._client_jobs: Dict[str, int] = {}
+        self._running = 0
+        self._backlog = 0.0
+        self.counters = {"admitted": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    def estimate(self, model: str, duration: float) -> float:
+        """Projected compute seconds for transcribing duration seconds with model."""
+        return duration * self._rtf.get(model, max(DEFAULT_RTF.values()))
+
+    def admit(self, client: str, model: str, duration: float) -> Ticket:
+        """
+        Queue a job or reject it.
+
+        Raises:
+            AdmissionRejected: if the backlog or the client's quota is exhausted
+        """
+        with self._cond:
+            cost = self.estimate(model, duration)
+            if self._client_jobs.get(client, 0) >= self.max_client_jobs:
+                self.counters["rejected"] += 1
+                raise AdmissionRejected(
+                    "Too many transcriptions in progress for this client.",
+                    self._retry_after(self._backlog / self.workers),
+                )
+            # Always admit into an idle server so a single long file can run.
+            if self._backlog and self._backlog + cost > self.max_backlog:
+                self.counters["rejected"] += 1
+                excess = self._backlog + cost - self.max_backlog
+                raise AdmissionRejected(
+                    "Server is busy, please retry later.",
+                    self._retry_after(excess / self.workers),
+                )
+
+            ticket = Ticket(client, model, duration, cost)
+            self._backlog += cost
+            self._client_jobs[client] = self._client_jobs.get(client, 0) + 1
+            if client not in self._waiting:
+                self._waiting[client] = deque()
+                self._rotation.append(client)
+            self._waiting[client].append(ticket)
+            self.counters["admitted"] += 1
+            self._dispatch()
+            return ticket
+
+    @contextmanager
+    def slot(self, ticket: Ticket):
+        """Wait for the ticket's turn, run the body, then release the worker."""
+        with self._cond:
+            while not ticket.started:
+                self._cond.wait()
+        ticket.restart_clock()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self._finish(ticket, time.perf_counter() - ticket.clock, ok)
+
+    def snapshot(self) -> dict:
+        """Current queue state and counters, for metrics."""
+        with self._cond:
+            return {
+                "running": self._running,
+                "queued": sum(len(q) for q in self._waiting.values()),
+                "backlog_seconds": self._backlog,
+                "max_backlog_seconds": self.max_backlog,
+                "workers": self.workers,
+                "rtf": dict(self._rtf),
+                **self.counters,
+            }
+
+    def _finish(self, ticket: Ticket, elapsed: float, ok: bool) -> None:
+        with self._cond:
+            if ok and ticket.duration > 0:
+                previous = self._rtf.get(ticket.model, elapsed / ticket.duration)
+                self._rtf[ticket.model] = (
+                    (1 - RTF_SMOOTHING) * previous + RTF_SMOOTHING * elapsed / ticket.duration
+                )
+            self.counters["completed" if ok else "failed"] += 1
+            self._running -= 1
+            self._backlog = max(0.0, self._backlog - ticket.cost)
+            remaining = self._client_jobs[ticket.client] - 1
+            if remaining:
+                self._client_jobs[ticket.client] = remaining
+            else:
+                del self._client_jobs[ticket.client]
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Start waiting tickets round-robin across clients while workers are free."""
+        started = False
+        while self._running < self.workers and self._rotation:
+            client = self._rotation.popleft()
+            queue = self._waiting[client]
+            queue.popleft().started = True
+            self._running += 1
+            started = True
+            if queue:
+                self._rotation.append(client)
+            else:
+                del self._waiting[client]
+        if started:
+            self._cond.notify_all()
+
+    @staticmethod
+    def _retry_after(seconds: float) -> int:
+        return max(1, math.ceil(seconds))
+
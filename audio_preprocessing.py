@@ -0,0 +1,158 @@
+"""
+Audio decoding with fast paths and a decoded-audio cache.
+
+Whisper decodes every file by piping it through an ffmpeg subprocess that
+resamples to 16 kHz mono float32. This module avoids that work where it can:
+
+- WAV files that are already 16 kHz mono PCM are read straight from a memory
+  map (16-bit integer samples are scaled to float32 in one vectorized pass;
+  32-bit float samples are used as-is, without a copy).
+- Anything else is decoded by ffmpeg once and stored as a float32 .npy file
+  under the cache directory, keyed by content hash; later loads memory-map it.
+
+The cache is trimmed to WHISPERTRANS_AUDIO_CACHE_MB (least recently used
+first).
+"""
+
+import os
+import struct
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import whisper
+
+SAMPLE_RATE = 16000
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _audio_cache_limit() -> int:
+    try:
+        return int(float(os.environ.get("WHISPERTRANS_AUDIO_CACHE_MB", 2048)) * 1024 * 1024)
+    except ValueError:
+        return 2048 * 1024 * 1024
+
+
+def wav_layout(path: str) -> Optional[Tuple[str, int, int]]:
+    """
+    Locate the samples of a 16 kHz mono PCM or float WAV file.
+
+    Returns:
+        (numpy dtype, byte offset, sample count), or None if the file needs
+        ffmpeg (other rates, channels, encodings, or not a WAV file)
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+                return None
+            layout = None
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+                if chunk_id == b"fmt ":
+                    fmt = f.read(size)
+                    tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+                    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                        tag = struct.unpack("<H", fmt[24:26])[0]
+                    if channels != 1 or rate != SAMPLE_RATE:
+                        return None
+                    if tag == WAVE_FORMAT_PCM and bits == 16:
+                        layout = "<i2"
+                    elif tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+                        layout = "<f4"
+                    else:
+                        return None
+                elif chunk_id == b"data":
+                    if layout is None:
+                        return None
+                    offset = f.tell()
+                    # Streaming writers may leave the size at 0 or 0xFFFFFFFF
+                    available = os.path.getsize(path) - offset
+                    size = available if size in (0, 0xFFFFFFFF) else min(size, available)
+                    return layout, offset, size // np.dtype(layout).itemsize
+                else:
+                    f.seek(size + (size & 1), os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+
+
+def _read_wav(path: str, layout: Tuple[str, int, int]) -> np.ndarray:
+    dtype, offset, count = layout
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    # Copy-on-write: torch.from_numpy() needs a writable array, pages stay shared
+    samples = np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=(count,))
+    if dtype == "<f4":
+        return samples
+    return samples.astype(np.float32) / 32768.0
+
+
+def _trim_cache(directory: str, keep: str) -> None:
+    """Delete least recently used files until the cache fits its size limit."""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".npy") and entry.path != keep:
+            stat = entry.stat()
+            entries.append((stat.st_atime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries) + os.path.getsize(keep)
+    for _, size, path in sorted(entries):
+        if total <= _audio_cache_limit():
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def load_audio(
+    audio_file: str, cache_key: Optional[str] = None, cache_dir: Optional[str] = None
+) -> Tuple[np.ndarray, dict]:
+    """
+    Load audio as 16 kHz mono float32, avoiding ffmpeg where possible.
+
+    Args:
+        audio_file: Path to the audio file
+        cache_key: Content hash of the file (no caching if None)
+        cache_dir: Cache root; decoded audio goes to its "audio" subdirectory
+
+    Returns:
+        (samples, report) where report has the "source" used ("wav", "cache"
+        or "ffmpeg") and "decode_seconds"
+    """
+    started = time.perf_counter()
+
+    def report(source: str) -> dict:
+        return {"source": source, "decode_seconds": time.perf_counter() - started}
+
+    layout = wav_layout(audio_file)
+    if layout is not None:
+        audio = _read_wav(audio_file, layout)
+        return audio, report("wav")
+
+    cache_path = None
+    if cache_key and cache_dir:
+        cache_path = os.path.join(cache_dir, "audio", f"{cache_key}.npy")
+        try:
+            audio = np.load(cache_path, mmap_mode="c")
+            os.utime(cache_path)  # mark as recently used for trimming
+            return audio, report("cache")
+        except (OSError, ValueError):
+            pass
+
+    audio = whisper.load_audio(audio_file)
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Per thread: web requests may decode the same upload concurrently
+        temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, audio)
+        os.replace(temp_path, cache_path)
+        _trim_cache(os.path.dirname(cache_path), cache_path)
+    return audio, report("ffmpeg")
@@ -0,0 +1,323 @@
+"""
+Lightweight CPU speaker diarization.
+
+Speech is found with an adaptive energy threshold, each 1.5-second speech
+window is embedded as the mean and spread of its log-mel spectrum, and the
+embeddings are clustered with spherical k-means, the speaker count being the
+one with the best silhouette score. Windows straddling a speaker change blend
+two voices and would form clusters of their own, so they are left out of the
+clustering and given the nearest speaker afterwards. This is far cheaper than a
+neural speaker model, runs alongside Whisper on the CPU, and is good enough to
+separate speakers in ordinary meeting recordings.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+import whisper
+
+FRAMES_PER_SECOND = 100  # Whisper's log-mel hop is 10 ms
+WINDOW_FRAMES = 150
+HOP_FRAMES = 75
+MAX_SPEAKERS = 8
+KMEANS_RESTARTS = 4
+# Embeddings are standardised across the recording, so a single speaker's
+# windows scatter like noise: any split of them scores a silhouette near 0.02,
+# while real speaker clusters score 0.2 and up. Below MIN_SILHOUETTE the
+# recording has one speaker; otherwise the smallest count within
+# SILHOUETTE_TOLERANCE of the best score wins.
+MIN_SILHOUETTE = 0.1
+SILHOUETTE_TOLERANCE = 0.02
+# Silhouettes are computed on at most this many windows (pairwise cost)
+SILHOUETTE_SAMPLE = 1000
+# A window whose two halves differ by more than this many (scaled) median
+# absolute deviations above the median difference straddles a speaker change
+TRANSITION_MADS = 3.0
+# Bumped when clustering changes, so cached turns are recomputed
+CACHE_VERSION = 3
+
+
+def speech_frames(mel: np.ndarray) -> np.ndarray:
+    """Flag log-mel frames whose energy is well above the recording's noise floor."""
+    energy = mel.mean(axis=0)
+    floor, peak = np.percentile(energy, [10, 95])
+    return energy > floor + 0.3 * (peak - floor)
+
+
+def window_embeddings(mel: np.ndarray, speech: np.ndarray):
+    """
+    Embed every mostly voiced window as the mean and spread of its voiced frames.
+
+    Returns:
+        (start frames of kept windows, L2-normalised embeddings)
+    """
+    n_frames = mel.shape[1]
+    if n_frames < WINDOW_FRAMES:
+        return np.zeros(0, dtype=int), np.zeros((0, 2 * mel.shape[0]), dtype=np.float32)
+
+    # Window statistics over voiced frames only, via cumulative sums
+    starts = np.arange(0, n_frames - WINDOW_FRAMES + 1, HOP_FRAMES)
+    voiced_mel = mel.astype(np.float64) * speech
+    zero = np.zeros((mel.shape[0], 1))
+    sums = np.concatenate([zero, np.cumsum(voiced_mel, axis=1)], axis=1)
+    squares = np.concatenate([zero, np.cumsum(voiced_mel**2, axis=1)], axis=1)
+    voiced = np.concatenate([[0], np.cumsum(speech)])
+
+    counts = voiced[starts + WINDOW_FRAMES] - voiced[starts]
+    keep = counts >= WINDOW_FRAMES // 2
+    starts, counts = starts[keep], counts[keep]
+    mean = (sums[:, starts + WINDOW_FRAMES] - sums[:, starts]) / counts
+    var = (squares[:, starts + WINDOW_FRAMES] - squares[:, starts]) / counts - mean**2
+    features = np.concatenate([mean, np.sqrt(np.maximum(var, 0.0))]).T
+
+    # Standardise across the recording so channel/room colouring cancels out
+    features = (features - features.mean(axis=0)) / (features.std(axis=0) + 1e-6)
+    features /= np.linalg.norm(features, axis=1, keepdims=True) + 1e-6
+    return starts, features.astype(np.float32)
+
+
+def transition_windows(mel: np.ndarray, speech: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Flag windows whose two halves sound unlike each other (a speaker change).
+
+    The halves' voiced-frame means are standardised across the recording and
+    compared; the difference is judged against the recording's own
+    distribution, so a single speaker's windows are hardly ever flagged.
+    """
+    half = WINDOW_FRAMES // 2
+    voiced_mel = mel.astype(np.float64) * speech
+    zero = np.zeros((mel.shape[0], 1))
+    sums = np.concatenate([zero, np.cumsum(voiced_mel, axis=1)], axis=1)
+    voiced = np.concatenate([[0], np.cumsum(speech)])
+
+    def half_means(begin: np.ndarray):
+        counts = voiced[begin + half] - voiced[begin]
+        return ((sums[:, begin + half] - sums[:, begin]) / np.maximum(counts, 1)).T, counts
+
+    first, first_counts = half_means(starts)
+    second, second_counts = half_means(starts + half)
+    both = np.concatenate([first, second])
+    center, scale = both.mean(axis=0), both.std(axis=0) + 1e-6
+    difference = np.linalg.norm((first - center) / scale - (second - center) / scale, axis=1)
+    # A half that is mostly pause says nothing about a change
+    difference[(first_counts < half // 4) | (second_counts < half // 4)] = 0.0
+
+    median = np.median(difference)
+    spread = 1.4826 * np.median(np.abs(difference - median))
+    return difference > median + TRANSITION_MADS * spread
+
+
+def spherical_kmeans(x: np.ndarray, k: int, iterations: int = 20, seed: int = 0):
+    """
+    Cluster unit vectors by cosine similarity.
+
+    Returns:
+        (labels, mean similarity of each vector to its centroid)
+    """
+    rng = np.random.default_rng(seed)
+    centers = [x[rng.integers(len(x))]]
+    for _ in range(1, k):
+        distance = 1.0 - (x @ np.array(centers).T).max(axis=1)
+        weights = np.maximum(distance, 0.0) ** 2
+        total = weights.sum()
+        index = rng.choice(len(x), p=weights / total) if total > 0 else rng.integers(len(x))
+        centers.append(x[index])
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        labels = (x @ centers.T).argmax(axis=1)
+        updated = centers.copy()
+        for c in range(k):
+            members = x[labels == c]
+            if len(members):
+                mean = members.sum(axis=0)
+                updated[c] = mean / (np.linalg.norm(mean) + 1e-6)
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+
+    similarity = x @ centers.T
+    labels = similarity.argmax(axis=1)
+    return labels, float(similarity.max(axis=1).mean())
+
+
+def _best_kmeans(x: np.ndarray, k: int) -> np.ndarray:
+    """Labels of the tightest of several spherical k-means runs."""
+    runs = [spherical_kmeans(x, k, seed=seed) for seed in range(KMEANS_RESTARTS)]
+    return max(runs, key=lambda run: run[1])[0]
+
+
+def silhouette(x: np.ndarray, labels: np.ndarray) -> float:
+    """Mean silhouette of unit vectors under cosine distance."""
+    if len(x) > SILHOUETTE_SAMPLE:
+        pick = np.random.default_rng(0).choice(len(x), SILHOUETTE_SAMPLE, replace=False)
+        x, labels = x[pick], labels[pick]
+    distance = 1.0 - x @ x.T
+    sizes = np.bincount(labels, minlength=labels.max() + 1)
+    # Mean distance from every vector to each cluster
+    to_cluster = np.stack([distance[:, labels == c].sum(axis=1) for c in range(len(sizes))], 1)
+    own = to_cluster[np.arange(len(x)), labels] / np.maximum(sizes[labels] - 1, 1)
+    to_cluster = to_cluster / np.maximum(sizes, 1)
+    to_cluster[np.arange(len(x)), labels] = np.inf
+    to_cluster[:, sizes == 0] = np.inf
+    nearest = to_cluster.min(axis=1)
+    scores = (nearest - own) / np.maximum(np.maximum(own, nearest), 1e-9)
+    scores[sizes[labels] == 1] = 0.0
+    return float(scores.mean())
+
+
+def cluster_speakers(embeddings: np.ndarray, num_speakers: Optional[int] = None) -> np.ndarray:
+    """Label embeddings by speaker, choosing the count when num_speakers is None."""
+    if num_speakers:
+        return _best_kmeans(embeddings, min(num_speakers, len(embeddings)))
+
+    candidates = {}
+    for k in range(2, min(MAX_SPEAKERS, len(embeddings) - 1) + 1):
+        labels = _best_kmeans(embeddings, k)
+        candidates[k] = (silhouette(embeddings, labels), labels)
+    best = max((score for score, _ in candidates.values()), default=0.0)
+    if best < MIN_SILHOUETTE:
+        return np.zeros(len(embeddings), dtype=int)
+    k = min(k for k, (score, _) in candidates.items() if score >= best - SILHOUETTE_TOLERANCE)
+    return candidates[k][1]
+
+
+def _nearest_cluster(x: np.ndarray, members: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """Label every vector of x by the nearest centroid of the labelled members."""
+    centroids = np.stack([members[labels == c].sum(axis=0) for c in range(labels.max() + 1)])
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-6
+    return (x @ centroids.T).argmax(axis=1)
+
+
+def _turns(starts: np.ndarray, labels: np.ndarray) -> List[dict]:
+    """Merge consecutive windows with the same speaker into turns."""
+    if len(labels) > 2:
+        # Relabel single windows that disagree with both neighbours
+        smoothed = labels.copy()
+        for i in range(1, len(labels) - 1):
+            if labels[i - 1] == labels[i + 1] != labels[i]:
+                smoothed[i] = labels[i - 1]
+        labels = smoothed
+
+    names = {}
+    turns: List[dict] = []
+    for start, label in zip(starts, labels):
+        speaker = names.setdefault(int(label), f"SPEAKER_{len(names) + 1}")
+        begin = float(start) / FRAMES_PER_SECOND
+        # Each window owns the centre part of its span, between neighbouring hops
+        begin_owned = begin + (WINDOW_FRAMES - HOP_FRAMES) / 2 / FRAMES_PER_SECOND
+        end_owned = begin_owned + HOP_FRAMES / FRAMES_PER_SECOND
+        if turns and turns[-1]["speaker"] == speaker and begin_owned - turns[-1]["end"] < 1e-6:
+            turns[-1]["end"] = end_owned
+        else:
+            turns.append({"start": begin_owned, "end": end_owned, "speaker": speaker})
+    return turns
+
+
+def diarize(audio: np.ndarray, num_speakers: Optional[int] = None) -> List[dict]:
+    """
+    Find speaker turns in 16 kHz mono audio.
+
+    Args:
+        audio: Audio samples as float32
+        num_speakers: Known number of speakers, or None to estimate it
+
+    Returns:
+        List of {"start", "end", "speaker"} turns in seconds
+    """
+    mel = whisper.log_mel_spectrogram(audio).numpy()
+    speech = speech_frames(mel)
+    starts, embeddings = window_embeddings(mel, speech)
+    if len(embeddings) == 0:
+        return []
+    steady = ~transition_windows(mel, speech, starts)
+    if steady.sum() < 3:
+        steady[:] = True
+    labels = cluster_speakers(embeddings[steady], num_speakers)
+    return _turns(starts, _nearest_cluster(embeddings, embeddings[steady], labels))
+
+
+def diarize_file(
+    audio_file: str,
+    cache_key: str,
+    num_speakers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    audio: Optional[np.ndarray] = None,
+) -> dict:
+    """
+    Diarize an audio file, reusing a cached result for the same content.
+
+    Args:
+        audio_file: Path to the audio file
+        cache_key: Content hash of the audio file
+        num_speakers: Known number of speakers, or None to estimate it
+        cache_dir: Directory for cached turns (no caching if None)
+        audio: Already decoded 16 kHz samples of the file (optional)
+
+    Returns:
+        Report with "turns", "speakers", CPU and wall "seconds", and "cached"
+    """
+    cache_path = None
+    if cache_dir and cache_key:
+        cache_path = os.path.join(
+            cache_dir,
+            "diarization",
+            f"{cache_key}-{num_speakers or 'auto'}-v{CACHE_VERSION}.json",
+        )
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                turns = json.load(f)
+            return _report(turns, 0.0, 0.0, cached=True)
+
+    started_cpu = time.thread_time()
+    started = time.perf_counter()
+    if audio is None:
+        audio = whisper.load_audio(audio_file)
+    turns = diarize(audio, num_speakers)
+    report = _report(
+        turns, time.thread_time() - started_cpu, time.perf_counter() - started, cached=False
+    )
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(turns, f)
+        os.replace(temp_path, cache_path)
+    return report
+
+
+def _report(turns: List[dict], cpu_seconds: float, wall_seconds: float, cached: bool) -> dict:
+    return {
+        "turns": turns,
+        "speakers": len({turn["speaker"] for turn in turns}),
+        "cpu_seconds": cpu_seconds,
+        "wall_seconds": wall_seconds,
+        "cached": cached,
+    }
+
+
+def assign_speakers(segments: List[dict], turns: List[dict]) -> None:
+    """Label each segment with the speaker who overlaps it most (nearest turn if none)."""
+    if not turns:
+        return
+    starts = np.array([turn["start"] for turn in turns])
+    ends = np.array([turn["end"] for turn in turns])
+    speakers = [turn["speaker"] for turn in turns]
+
+    for segment in segments:
+        overlap = np.minimum(ends, segment["end"]) - np.maximum(starts, segment["start"])
+        if overlap.max() > 0:
+            totals = {}
+            for speaker, amount in zip(speakers, overlap):
+                if amount > 0:
+                    totals[speaker] = totals.get(speaker, 0.0) + amount
+            segment["speaker"] = max(totals, key=totals.get)
+        else:
+            middle = (segment["start"] + segment["end"]) / 2
+            gaps = np.maximum(starts - middle, middle - ends)
+            segment["speaker"] = speakers[int(gaps.argmin())]
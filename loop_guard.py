@@ -0,0 +1,294 @@
+"""
+Repetition-loop and hallucination guard.
+
+On music, noise or silence Whisper can get stuck emitting the same phrase
+until a 30-second window's token budget runs out, then carry the loop into the
+following windows through the previous-text prompt. The guard:
+
+- watches each window while it is decoded and ends it as soon as the text
+  tail repeats or its compression ratio becomes abnormal, instead of letting
+  the decoder run to the token limit. A window cut short is reported with a
+  low average log probability, so Whisper's temperature fallback retries it
+  as it would have retried the full-length loop;
+- drops the previous-text prompt when retrying an aborted window, or after the
+  same text came out of several windows in a row;
+- flags the segments of windows whose final attempt was still cut short, and
+  other segments that look like loops, so outputs can leave them out.
+"""
+
+import time
+from collections import deque
+from dataclasses import replace
+from typing import Deque, List, Optional, Sequence, Tuple
+
+import torch
+from torch import Tensor
+from whisper.decoding import DecodingOptions, DecodingTask, LogitFilter
+from whisper.tokenizer import Tokenizer
+from whisper.transcribe import transcribe as whisper_transcribe
+from whisper.utils import compression_ratio
+
+from speculative_decoding import SpeculativeWhisper
+
+# A tail counts as a loop when a unit of up to MAX_LOOP_UNIT tokens repeats at
+# least LOOP_MIN_REPEATS times and covers at least LOOP_MIN_TOKENS tokens, so
+# short emphatic repeats ("no, no, no") are left alone.
+LOOP_MIN_REPEATS = 3
+LOOP_MIN_TOKENS = 12
+MAX_LOOP_UNIT = 32
+# Compression ratio is checked every few steps, on text long enough to matter;
+# the limit matches Whisper's own compression_ratio_threshold.
+COMPRESSION_CHECK_INTERVAL = 16
+COMPRESSION_MIN_CHARS = 100
+COMPRESSION_RATIO_LIMIT = 2.4
+# Windows (or consecutive segments) with identical text that form a loop
+REPEATED_TEXT_LIMIT = 3
+# A run of identical segments is only flagged when it holds this many words,
+# so short replies ("Yes." / "Yes." / "Yes.") are left alone
+REPEATED_RUN_MIN_WORDS = LOOP_MIN_TOKENS
+# Average log probability reported for a window cut short; well below
+# Whisper's default logprob_threshold (-1.0), so the window is retried
+ABORTED_LOGPROB = -10.0
+
+
+def find_loop(items: Sequence) -> int:
+    """Length of the unit repeated at the end of items, or 0 if there is no loop."""
+    for unit in range(1, MAX_LOOP_UNIT + 1):
+        repeats = max(LOOP_MIN_REPEATS, -(-LOOP_MIN_TOKENS // unit))
+        span = unit * repeats
+        if span > len(items):
+            break
+        tail = list(items[-span:])
+        if tail == tail[-unit:] * repeats:
+            return unit
+    return 0
+
+
+class LoopBreaker(LogitFilter):
+    """Force end-of-text for sequences caught in a loop."""
+
+    # Tokens drafted in speculative decoding may be rejected by the target,
+    # so they must not count as loops
+    apply_to_drafts = False
+
+    def __init__(self, tokenizer: Tokenizer, sample_begin: int):
+        self.tokenizer = tokenizer
+        self.sample_begin = sample_begin
+        self.steps = 0
+        self.stopped: dict = {}  # row -> reason
+
+    def apply(self, logits: Tensor, tokens: Tensor) -> None:
+        self.steps = tokens.shape[1] - self.sample_begin
+        if self.steps < LOOP_MIN_TOKENS:
+            return
+        eot = self.tokenizer.eot
+        check_ratio = self.steps % COMPRESSION_CHECK_INTERVAL == 0
+        for row, sequence in enumerate(tokens[:, self.sample_begin :].tolist()):
+            if sequence[-1] == eot:
+                continue
+            # Timestamps differ between repeats; only text tokens (below eot) count
+            text_tokens = [t for t in sequence if t < eot]
+            reason = None
+            if find_loop(text_tokens):
+                reason = "repetition"
+            elif check_ratio:
+                text = self.tokenizer.decode(text_tokens)
+                if len(text) >= COMPRESSION_MIN_CHARS and (
+                    compression_ratio(text) > COMPRESSION_RATIO_LIMIT
+                ):
+                    reason = "compression_ratio"
+            if reason:
+                logits[row] = -float("inf")
+                logits[row, eot] = 0
+                self.stopped[row] = reason
+
+
+class GuardedWhisper:
+    """
+    Wrap a (possibly speculative) Whisper model for one transcription.
+
+    Like SpeculativeWhisper, everything except decoding is forwarded to the
+    wrapped model. Keeps per-transcription state, so create one per call.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.stats = {
+            "aborted_decodes": 0,
+            "repetition": 0,
+            "compression_ratio": 0,
+            "prompt_resets": 0,
+            "repeated_windows": 0,
+            "saved_tokens": 0,
+            "saved_seconds": 0.0,
+        }
+        # (tokens, reason) of windows whose final attempt was cut short
+        self.aborted_windows: List[Tuple[Tuple[int, ...], str]] = []
+        self._aborted_mel: Optional[Tensor] = None
+        self._reset_prompt = False
+        self._recent: Deque[Tuple[Tensor, str]] = deque(maxlen=REPEATED_TEXT_LIMIT)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def __call__(self, *args, **kwargs):
+        return self.model(*args, **kwargs)
+
+    @torch.no_grad()
+    def decode(self, mel: Tensor, options: DecodingOptions = DecodingOptions(), **kwargs):
+        single = mel.ndim == 2
+        batch = mel.unsqueeze(0) if single else mel
+        if kwargs:
+            options = replace(options, **kwargs)
+        if options.prompt and (self._reset_prompt or mel is self._aborted_mel):
+            options = replace(options, prompt=None)
+            self.stats["prompt_resets"] += 1
+        self._reset_prompt = False
+
+        speculative = isinstance(self.model, SpeculativeWhisper)
+        task = self.model.new_task(options) if speculative else DecodingTask(self.model, options)
+        breaker = LoopBreaker(task.tokenizer, task.sample_begin)
+        task.logit_filters.append(breaker)
+        started = time.perf_counter()
+        result = self.model.run_task(task, batch) if speculative else task.run(batch)
+        elapsed = time.perf_counter() - started
+
+        reasons: List[Optional[str]] = [None] * len(result)
+        if breaker.stopped:
+            self.stats["aborted_decodes"] += 1
+            for reason in set(breaker.stopped.values()):
+                self.stats[reason] += 1
+            if len(breaker.stopped) >= batch.shape[0] * task.n_group:
+                # Without the guard the loop would have run to the token budget
+                budget = options.sample_len or self.model.dims.n_text_ctx // 2
+                saved = max(0, budget - breaker.steps)
+                self.stats["saved_tokens"] += saved
+                self.stats["saved_seconds"] += saved * elapsed / max(breaker.steps, 1)
+            reasons = [self._abort_reason(r, task.tokenizer.eot) for r in result]
+            # A forced end-of-text leaves short, confident-looking text that
+            # would pass Whisper's fallback checks; make it fail them instead
+            result = [
+                replace(r, avg_logprob=min(r.avg_logprob, ABORTED_LOGPROB)) if reason else r
+                for r, reason in zip(result, reasons)
+            ]
+
+        if single:
+            if mel is self._aborted_mel and self.aborted_windows:
+                self.aborted_windows.pop()  # only a window's final attempt counts
+            self._aborted_mel = mel if reasons[0] else None
+            if reasons[0]:
+                self.aborted_windows.append((tuple(result[0].tokens), reasons[0]))
+            self._track_window(mel, result[0].text)
+            return result[0]
+        return result
+
+    @staticmethod
+    def _abort_reason(result, eot: int) -> Optional[str]:
+        """Why the chosen sequence was cut short, or None if it ended on its own."""
+        if find_loop([t for t in result.tokens if t < eot]):
+            return "repetition"
+        if len(result.text) >= COMPRESSION_MIN_CHARS and (
+            compression_ratio(result.text) > COMPRESSION_RATIO_LIMIT
+        ):
+            return "compression_ratio"
+        return None
+
+    def _track_window(self, window: Tensor, text: str) -> None:
+        """Reset the prompt once the same text came out of several windows in a row."""
+        if self._recent and self._recent[-1][0] is window:
+            self._recent.pop()  # a retry replaces the window's earlier attempt
+        self._recent.append((window, " ".join(text.lower().split())))
+        texts = {t for _, t in self._recent}
+        if len(self._recent) == REPEATED_TEXT_LIMIT and len(texts) == 1 and texts != {""}:
+            self.stats["repeated_windows"] += 1
+            self._reset_prompt = True
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        return whisper_transcribe(self, audio, **kwargs)
+
+
+def _is_slice(part: Tuple[int, ...], whole: Tuple[int, ...]) -> bool:
+    n = len(part)
+    return any(whole[i : i + n] == part for i in range(len(whole) - n + 1))
+
+
+def flag_segments(
+    segments: List[dict], aborted_windows: Sequence[Tuple[Tuple[int, ...], str]] = ()
+) -> None:
+    """
+    Mark segments that look like loops with a "hallucination" reason.
+
+    Args:
+        segments: Whisper segments
+        aborted_windows: GuardedWhisper.aborted_windows; segments cut from
+                         these windows' tokens are flagged with their reason
+    """
+    normalized = [" ".join(s["text"].lower().split()) for s in segments]
+    for i, segment in enumerate(segments):
+        tokens = tuple(segment.get("tokens") or ())
+        aborted = next(
+            (reason for window, reason in aborted_windows if tokens and _is_slice(tokens, window)),
+            None,
+        )
+        if aborted:
+            segment["hallucination"] = aborted
+        elif segment.get("compression_ratio", 0.0) > COMPRESSION_RATIO_LIMIT:
+            segment["hallucination"] = "compression_ratio"
+        elif find_loop(normalized[i].split()):
+            segment["hallucination"] = "repetition"
+
+    # Runs of identical consecutive segments
+    start = 0
+    for i in range(1, len(segments) + 1):
+        if i < len(segments) and normalized[i] == normalized[start]:
+            continue
+        words = (i - start) * len(normalized[start].split())
+        if i - start >= REPEATED_TEXT_LIMIT and words >= REPEATED_RUN_MIN_WORDS:
+            for segment in segments[start:i]:
+                segment.setdefault("hallucination", "repetition")
+        start = i
+
+
+def guarded_transcribe(model, audio, **options) -> dict:
+    """
+    Transcribe with the guard, flag looping segments and add a "guard" report.
+
+    Returns:
+        Whisper's result, with "guard" holding abort counters, estimated
+        decoder time saved and the flagged segments' count and duration
+    """
+    guarded = GuardedWhisper(model)
+    return guard_report(guarded.transcribe(audio, **options), guarded)
+
+
+def guard_report(result: dict, *guards: GuardedWhisper) -> dict:
+    """
+    Flag looping segments of a guarded transcription and add its "guard" report.
+
+    A result stitched together from several guarded transcriptions (cascade
+    passes) gets the guards' counters added up.
+    """
+    aborted_windows = [window for guarded in guards for window in guarded.aborted_windows]
+    flag_segments(result["segments"], aborted_windows)
+    flagged = [s for s in result["segments"] if "hallucination" in s]
+    stats = dict(guards[0].stats)
+    for guarded in guards[1:]:
+        for key, value in guarded.stats.items():
+            stats[key] += value
+    result["guard"] = {
+        **stats,
+        "flagged_segments": len(flagged),
+        "flagged_seconds": sum(s["end"] - s["start"] for s in flagged),
+    }
+    return result
+
+
+def format_guard_report(report: dict) -> str:
+    """Return a one-line summary of loop guard activity."""
+    return (
+        f"{report['aborted_decodes']} decodes cut short "
+        f"({report['repetition']} repetition, {report['compression_ratio']} compression), "
+        f"{report['prompt_resets']} prompt resets, ~{report['saved_seconds']:.1f}s decoder "
+        f"time saved; {report['flagged_segments']} segments "
+        f"({report['flagged_seconds']:.1f}s) flagged"
+    )
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Offline Whisper model store.
+
+`whisper.load_model()` downloads checkpoints on first use, re-hashes the whole
+file on every load and reads it fully into memory. The store instead keeps
+pre-staged checkpoints in a directory (WHISPERTRANS_MODEL_DIR, default
+Whisper's own download directory):
+
+- The original checkpoint is verified against the SHA-256 embedded in
+  Whisper's download URL when it is staged.
+- A float32 copy is written next to it in torch's zip format, so it can be
+  memory-mapped: processes loading the same model share page-cache pages
+  instead of each holding a private copy, and startup only touches the pages
+  it needs.
+- manifest.json records both checksums; loads only check file sizes, a full
+  re-hash is done by `verify`.
+
+Set WHISPERTRANS_OFFLINE=1 to fail instead of downloading models that are not
+staged.
+
+Usage:
+    python model_store.py list
+    python model_store.py prefetch small --source /mnt/usb/whisper
+    python model_store.py verify
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+import whisper
+from whisper.model import ModelDimensions, Whisper
+
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 1 << 20
+# torch.load(mmap=True), torch.device as a context manager and
+# load_state_dict(assign=True) all need torch 2.1
+MMAP_SUPPORTED = tuple(int(part) for part in torch.__version__.split(".")[:2]) >= (2, 1)
+
+
+def default_store_dir() -> str:
+    """WHISPERTRANS_MODEL_DIR, or the directory whisper.load_model() downloads to."""
+    if os.environ.get("WHISPERTRANS_MODEL_DIR"):
+        return os.environ["WHISPERTRANS_MODEL_DIR"]
+    default = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(os.getenv("XDG_CACHE_HOME", default), "whisper")
+
+
+def offline() -> bool:
+    return os.environ.get("WHISPERTRANS_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def expected_sha256(name: str) -> str:
+    """Checksum of the official checkpoint, taken from its download URL."""
+    if name not in whisper._MODELS:
+        raise ValueError(f"Unknown model: {name}")
+    return whisper._MODELS[name].split("/")[-2]
+
+
+def checkpoint_filename(name: str) -> str:
+    """File name Whisper itself uses for the checkpoint."""
+    return os.path.basename(whisper._MODELS[name])
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(store_dir: str) -> Dict[str, dict]:
+    try:
+        with open(os.path.join(store_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(store_dir: str, manifest: Dict[str, dict]) -> None:
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def prefetch(name: str, source: Optional[str] = None, store_dir: Optional[str] = None) -> dict:
+    """
+    Stage a model: verify the original checkpoint and write the mmap-able copy.
+
+    Args:
+        name: Whisper model name
+        source: Checkpoint file, or a directory containing it (e.g. another
+                machine's ~/.cache/whisper). Downloads when omitted.
+        store_dir: Store directory (default: default_store_dir())
+
+    Returns:
+        The model's manifest entry
+
+    Raises:
+        FileNotFoundError: if source does not contain the checkpoint
+        ValueError: if the checkpoint does not match its published checksum
+    """
+    store_dir = store_dir or default_store_dir()
+    os.makedirs(store_dir, exist_ok=True)
+    filename = checkpoint_filename(name)
+    target = os.path.join(store_dir, filename)
+    expected = expected_sha256(name)
+
+    if source:
+        if os.path.isdir(source):
+            source = os.path.join(source, filename)
+        if not os.path.isfile(source):
+            raise FileNotFoundError(f"Checkpoint not found: {source}")
+        if os.path.abspath(source) != os.path.abspath(target):
+            shutil.copyfile(source, target + ".tmp")
+            os.replace(target + ".tmp", target)
+    elif not os.path.isfile(target):
+        if offline():
+            raise FileNotFoundError(f"{name} is not staged and WHISPERTRANS_OFFLINE is set")
+        whisper._download(whisper._MODELS[name], store_dir, False)
+
+    actual = sha256_file(target)
+    if actual != expected:
+        os.remove(target)
+        raise ValueError(f"Checksum mismatch for {name}: expected {expected}, got {actual}")
+
+    # Float32 copy: CPU inference runs in float32, and assigning mmapped
+    # tensors directly only shares pages if no dtype conversion is needed
+    checkpoint = torch.load(target, map_location="cpu")
+    state = {k: v.float() if v.is_floating_point() else v
+             for k, v in checkpoint["model_state_dict"].items()}
+    cpu_file = f"{name}-fp32.pt"
+    cpu_path = os.path.join(store_dir, cpu_file)
+    torch.save({"dims": checkpoint["dims"], "model_state_dict": state}, cpu_path + ".tmp")
+    os.replace(cpu_path + ".tmp", cpu_path)
+
+    manifest = load_manifest(store_dir)
+    manifest[name] = {
+        "checkpoint": filename,
+        "sha256": actual,
+        "cpu_checkpoint": cpu_file,
+        "cpu_sha256": sha256_file(cpu_path),
+        "cpu_size": os.path.getsize(cpu_path),
+        "staged_at": time.time(),
+    }
+    _save_manifest(store_dir, manifest)
+    return manifest[name]
+
+
+def verify(name: str, store_dir: Optional[str] = None) -> List[str]:
+    """
+    Re-hash a staged model's files.
+
+    Returns:
+        Problems found (empty if the model is intact)
+    """
+    store_dir = store_dir or default_store_dir()
+    entry = load_manifest(store_dir).get(name)
+    if entry is None:
+        return [f"{name} is not staged"]
+    problems = []
+    checks = [
+        (entry["checkpoint"], expected_sha256(name)),
+        (entry["cpu_checkpoint"], entry["cpu_sha256"]),
+    ]
+    for filename, expected in checks:
+        path = os.path.join(store_dir, filename)
+        if not os.path.isfile(path):
+            problems.append(f"{filename} is missing")
+        elif sha256_file(path) != expected:
+            problems.append(f"{filename} does not match its checksum")
+    return problems
+
+
+def staged_path(name: str, store_dir: Optional[str] = None) -> Optional[str]:
+    """Path of the mmap-able checkpoint, or None if the model is not (fully) staged."""
+    store_dir = store_dir or default_store_dir()
+    entry = load_manifest(store_dir).get(name)
+    if entry is None:
+        return None
+    path = os.path.join(store_dir, entry["cpu_checkpoint"])
+    try:
+        # Cheap integrity check on every load; `verify` re-hashes
+        if os.path.getsize(path) == entry["cpu_size"]:
+            return path
+    except OSError:
+        pass
+    print(f"Staged {name} model is incomplete; run `python model_store.py prefetch {name}`")
+    return None
+
+
+def _load_mmapped(name: str, path: str) -> Whisper:
+    """Build a model whose weights point straight at the memory-mapped file."""
+    checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    dims = ModelDimensions(**checkpoint["dims"])
+    # Skip random initialisation of weights that are replaced right away
+    with torch.device("meta"):
+        model = Whisper(dims)
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+
+    # Non-persistent buffers are not in the checkpoint; rebuild them as
+    # Whisper's constructor does
+    n_ctx = dims.n_text_ctx
+    mask = torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1)
+    model.decoder.register_buffer("mask", mask, persistent=False)
+    model.set_alignment_heads(whisper._ALIGNMENT_HEADS[name])
+
+    leftover = [n for n, t in [*model.named_parameters(), *model.named_buffers()] if t.is_meta]
+    if leftover:
+        raise RuntimeError(f"Unsupported Whisper version, uninitialised tensors: {leftover}")
+    return model
+
+
+def load_model(name: str, device: Optional[str] = None, store_dir: Optional[str] = None):
+    """
+    Load a model from the store, memory-mapped when it has been staged.
+
+    Falls back to whisper.load_model() (downloading into the store) for
+    models that are not staged, unless WHISPERTRANS_OFFLINE is set.
+
+    Raises:
+        FileNotFoundError: if the model is not staged and downloads are disabled
+    """
+    store_dir = store_dir or default_store_dir()
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    path = staged_path(name, store_dir) if name in whisper._MODELS else None
+    if path is not None and not MMAP_SUPPORTED:
+        # Older torch: read the staged copy into memory (no checksum pass)
+        model = whisper.load_model(path, device=device)
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[name])
+        return model
+    if path is not None:
+        return _load_mmapped(name, path).to(device)
+    if offline():
+        raise FileNotFoundError(
+            f"Model '{name}' is not staged in {store_dir}; "
+            f"run `python model_store.py prefetch {name} --source <path>`"
+        )
+    return whisper.load_model(name, device=device, download_root=store_dir)
+
+
+def list_models(store_dir: Optional[str] = None) -> List[dict]:
+    """Staged models, plus checkpoints downloaded by Whisper but not yet staged."""
+    store_dir = store_dir or default_store_dir()
+    manifest = load_manifest(store_dir)
+    rows = []
+    for name in whisper._MODELS:
+        entry = manifest.get(name)
+        if entry is not None:
+            status, filename = "staged", entry["cpu_checkpoint"]
+        else:
+            status, filename = "downloaded", checkpoint_filename(name)
+        path = os.path.join(store_dir, filename)
+        if os.path.isfile(path):
+            rows.append({"model": name, "status": status, "bytes": os.path.getsize(path)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage pre-staged Whisper models")
+    parser.add_argument("--store", default=None,
+                        help="Store directory (default: WHISPERTRANS_MODEL_DIR or ~/.cache/whisper)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Show staged and downloaded models")
+    prefetch_parser = commands.add_parser("prefetch", help="Stage models into the store")
+    prefetch_parser.add_argument("models", nargs="+", choices=list(whisper._MODELS),
+                                 metavar="MODEL")
+    prefetch_parser.add_argument("--source",
+                                 help="Checkpoint file or directory to copy from (default: download)")
+    verify_parser = commands.add_parser("verify", help="Re-hash staged models")
+    verify_parser.add_argument("models", nargs="*", metavar="MODEL",
+                               help="Models to verify (default: all staged)")
+    args = parser.parse_args()
+    store_dir = args.store or default_store_dir()
+
+    if args.command == "list":
+        rows = list_models(store_dir)
+        print(f"Model store: {store_dir}")
+        for row in rows:
+            print(f"  {row['model']:<12} {row['status']:<11} {row['bytes'] / 1e6:8.0f} MB")
+        if not rows:
+            print("  (empty)")
+    elif args.command == "prefetch":
+        for name in args.models:
+            try:
+                entry = prefetch(name, args.source, store_dir)
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+            print(f"Staged {name} ({entry['sha256'][:12]}...)")
+    else:
+        names = args.models or list(load_manifest(store_dir))
+        failed = False
+        for name in names:
+            problems = verify(name, store_dir)
+            failed = failed or bool(problems)
+            print(f"{name}: {'; '.join(problems) if problems else 'OK'}")
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,17 @@ a = Analysis(
         (os.path.join(project_root, '.env.example'), '.'),
         # Include whisper_trans.py module
         (os.path.join(project_root, 'whisper_trans.py'), '.'),
+        (os.path.join(project_root, 'speculative_decoding.py'), '.'),
+        (os.path.join(project_root, 'admission.py'), '.'),
+        (os.path.join(project_root, 'singleflight.py'), '.'),
+        (os.path.join(project_root, 'diarization.py'), '.'),
+        (os.path.join(project_root, 'watch_folder.py'), '.'),
+        (os.path.join(project_root, 'runtime_config.py'), '.'),
+        (os.path.join(project_root, 'model_store.py'), '.'),
+        (os.path.join(project_root, 'loop_guard.py'), '.'),
+        (os.path.join(project_root, 'audio_preprocessing.py'), '.'),
+        (os.path.join(project_root, 'subtitle_reflow.py'), '.'),
+        (os.path.join(project_root, 'profiling.py'), '.'),
         # Include whisper assets (mel_filters.npz, tiktoken files)
         (whisper_assets, 'whisper/assets'),
         (whisper_normalizers, 'whisper/normalizers'),
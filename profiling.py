@@ -0,0 +1,193 @@
+"""
+On-demand profiling of a single transcription.
+
+A JobProfiler runs cProfile and torch.profiler around one job and writes:
+
+- <name>.prof: cProfile statistics (snakeviz, flameprof or gprof2dot turn it
+  into flame graphs / call graphs)
+- <name>.trace.json: torch operator timeline in Chrome trace format (open in
+  Perfetto or chrome://tracing)
+- <name>.txt: the summary printed at the end of the job
+
+The summary attributes time to pipeline stages (audio decode, mel spectrogram,
+encoder, decoder, temperature-fallback retries, ...) and lists the top
+functions and torch operators. No hooks are installed unless a job asks for
+profiling, so unprofiled jobs pay no overhead.
+
+cProfile hooks are process-wide on recent Pythons, so only one job is
+profiled at a time; a job that asks while another is being profiled runs
+unprofiled.
+"""
+
+import cProfile
+import importlib
+import io
+import os
+import pstats
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from whisper.transcribe import transcribe as whisper_transcribe
+
+DEFAULT_TOP = 20
+
+# (stage, module, qualified name) of the functions whose inclusive time makes
+# up each stage; a stage listed twice adds up its functions
+STAGE_FUNCTIONS = [
+    ("audio decode", "audio_preprocessing", "load_audio"),
+    ("mel spectrogram", "whisper.audio", "log_mel_spectrogram"),
+    ("language detection", "whisper.decoding", "detect_language"),
+    ("encoder", "whisper.model", "AudioEncoder.forward"),
+    ("decoder", "whisper.model", "TextDecoder.forward"),
+    ("decoder", "speculative_decoding", "decoder_forward"),
+    ("loop guard", "loop_guard", "LoopBreaker.apply"),
+    ("word timestamps", "whisper.timing", "add_word_timestamps"),
+]
+
+_profiling = threading.Lock()
+
+
+def _stage_keys() -> List[Tuple[str, tuple]]:
+    """pstats keys (file, line, function name) of STAGE_FUNCTIONS."""
+    keys = []
+    for stage, module_name, qualname in STAGE_FUNCTIONS:
+        try:
+            target = importlib.import_module(module_name)
+            for part in qualname.split("."):
+                target = getattr(target, part)
+        except (ImportError, AttributeError):
+            continue
+        code = getattr(target, "__wrapped__", target).__code__
+        keys.append((stage, (code.co_filename, code.co_firstlineno, code.co_name)))
+    return keys
+
+
+class _DecodeTimer:
+    """Forward to a model, timing each decode() call Whisper makes."""
+
+    def __init__(self, model, calls: List[dict]):
+        self.model = model
+        self.calls = calls
+        self._last_mel = None
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def __call__(self, *args, **kwargs):
+        return self.model(*args, **kwargs)
+
+    def decode(self, mel, *args, **kwargs):
+        # Whisper retries a window with the same mel tensor at the next temperature
+        retry = mel is self._last_mel
+        self._last_mel = mel
+        started = time.perf_counter()
+        result = self.model.decode(mel, *args, **kwargs)
+        self.calls.append({"retry": retry, "seconds": time.perf_counter() - started})
+        return result
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        return whisper_transcribe(self, audio, **kwargs)
+
+
+class JobProfiler:
+    """
+    Profile one job: use as a context manager around it.
+
+    Pass the profiler to transcribe_audio() as well so temperature-fallback
+    retries are timed separately. After the block, `summary` holds the stage
+    times and output files, or None if another job was being profiled.
+    """
+
+    def __init__(self, output_dir: str, name: str, top: int = DEFAULT_TOP):
+        self.output_dir = output_dir
+        self.name = name
+        self.top = top
+        self.summary: Optional[dict] = None
+        self.active = False
+        self._decode_calls: List[dict] = []
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._torch = None
+        self._started = 0.0
+
+    def wrap(self, model):
+        """Model to hand to Whisper so each decode attempt is timed."""
+        return _DecodeTimer(model, self._decode_calls) if self.active else model
+
+    def __enter__(self) -> "JobProfiler":
+        if not _profiling.acquire(blocking=False):
+            print("Profiling skipped: another job is being profiled")
+            return self
+        self.active = True
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._torch = torch.profiler.profile(activities=activities)
+        self._torch.__enter__()
+        self._cprofile = cProfile.Profile()
+        self._started = time.perf_counter()
+        self._cprofile.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if not self.active:
+            return
+        try:
+            self._cprofile.disable()
+            wall = time.perf_counter() - self._started
+            self._torch.__exit__(None, None, None)
+            self.summary = self._save(wall)
+        finally:
+            self.active = False
+            _profiling.release()
+
+    def _save(self, wall: float) -> dict:
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, self.name)
+        stats = pstats.Stats(self._cprofile)
+        stats.dump_stats(f"{base}.prof")
+        self._torch.export_chrome_trace(f"{base}.trace.json")
+
+        stages: Dict[str, float] = {}
+        for stage, key in _stage_keys():
+            if key in stats.stats:
+                cumulative = stats.stats[key][3]
+                stages[stage] = stages.get(stage, 0.0) + cumulative
+        retries = [c for c in self._decode_calls if c["retry"]]
+        stages["fallback retries"] = sum(c["seconds"] for c in retries)
+
+        functions = io.StringIO()
+        pstats.Stats(self._cprofile, stream=functions).sort_stats("cumulative").print_stats(
+            self.top
+        )
+        operators = self._torch.key_averages().table(
+            sort_by="self_cpu_time_total", row_limit=self.top
+        )
+        summary = {
+            "wall_seconds": wall,
+            "stages": stages,
+            "decode_calls": len(self._decode_calls),
+            "fallback_retries": len(retries),
+            "files": [f"{base}.prof", f"{base}.trace.json", f"{base}.txt"],
+        }
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(format_profile_summary(summary) + "\n\n")
+            f.write(f"Top {self.top} torch operators by self CPU time:\n{operators}\n")
+            f.write(f"Top {self.top} functions by cumulative time:\n{functions.getvalue()}")
+        return summary
+
+
+def format_profile_summary(summary: dict) -> str:
+    """Return stage times, largest first, and where the profile was written."""
+    wall = summary["wall_seconds"]
+    lines = [
+        f"Profiled {wall:.2f}s: {summary['decode_calls']} decode calls, "
+        f"{summary['fallback_retries']} fallback retries"
+    ]
+    for stage, seconds in sorted(summary["stages"].items(), key=lambda item: -item[1]):
+        share = seconds / wall if wall else 0.0
+        lines.append(f"  {stage:<20} {seconds:8.2f}s {share:6.1%}")
+    lines.append("Stage times are inclusive (the decoder includes its retries)")
+    lines.append("Written to " + ", ".join(summary["files"]))
+    return "\n".join(lines)
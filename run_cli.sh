@@ -74,13 +74,14 @@ echo "Available output formats:"
 echo "  txt  - Plain text transcript"
 echo "  srt  - Subtitle format (SRT)"
 echo "  vtt  - Web video text tracks (VTT)"
+echo "  json - Segments with timestamps (JSON)"
 echo ""
 read -p "[?] Choose format [txt]: " FORMAT_INPUT
 FORMAT=${FORMAT_INPUT:-txt}
 
 # Validate format
 case $FORMAT in
-    txt|srt|vtt)
+    txt|srt|vtt|json)
         ;;
     *)
         echo "[ERROR] Invalid format. Using 'txt' instead"
@@ -93,6 +94,14 @@ echo ""
 read -p "[?] Enter language code (optional, press Enter for auto-detect): " LANGUAGE_INPUT
 LANGUAGE=$LANGUAGE_INPUT
 
+# Ask for speaker labels
+echo ""
+DIARIZE=false
+read -p "[?] Identify speakers? (y/n) [n]: " DIARIZE_INPUT
+if [[ $DIARIZE_INPUT =~ ^[Yy]$ ]]; then
+    DIARIZE=true
+fi
+
 # Ask for verbose output
 echo ""
 read -p "[?] Show detailed progress? (y/n) [n]: " VERBOSE_INPUT
@@ -108,6 +117,7 @@ echo "  File:      $AUDIO_FILE"
 echo "  Model:     $MODEL"
 echo "  Format:    $FORMAT"
 echo "  Language:  ${LANGUAGE:-Auto-detect}"
+echo "  Speakers:  $DIARIZE"
 echo "  Verbose:   $VERBOSE"
 echo "=================================="
 echo ""
@@ -117,6 +127,7 @@ python whisper_trans.py "$AUDIO_FILE" \
     --model "$MODEL" \
     --format "$FORMAT" \
     ${LANGUAGE:+--language "$LANGUAGE"} \
+    $([[ $DIARIZE == true ]] && echo "--diarize") \
     $([[ $VERBOSE == true ]] && echo "--verbose")
 
 echo ""
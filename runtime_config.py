@@ -0,0 +1,246 @@
+"""
+Torch thread and CPU affinity configuration for CPU deployments.
+
+By default torch uses every core for intra-op parallelism, so several
+WhisperTrans processes on one host oversubscribe the CPU. Settings come from
+CLI flags or environment variables:
+
+    WHISPERTRANS_THREADS          intra-op threads per process (torch.set_num_threads)
+    WHISPERTRANS_INTEROP_THREADS  inter-op threads per process
+    WHISPERTRANS_CPU_AFFINITY     CPUs to run on, e.g. "0-7" or "0,2,4,6"; split
+                                  evenly between workers
+    WHISPERTRANS_AUTOTUNE         "1" to calibrate the thread count on startup
+
+The auto-tuner times a short encoder/decoder pass at several thread counts and
+keeps the smallest count within 10% of the fastest, leaving the remaining
+cores to other workers. The choice is persisted per host, model and worker
+count so later starts skip calibration.
+"""
+
+import json
+import os
+import platform
+import time
+from typing import Dict, List, Optional
+
+import torch
+
+ENV_THREADS = "WHISPERTRANS_THREADS"
+ENV_INTEROP_THREADS = "WHISPERTRANS_INTEROP_THREADS"
+ENV_CPU_AFFINITY = "WHISPERTRANS_CPU_AFFINITY"
+ENV_AUTOTUNE = "WHISPERTRANS_AUTOTUNE"
+TUNING_TOLERANCE = 1.1
+
+# Configuration in effect for this process, for logs and metrics
+_current: dict = {}
+
+
+def parse_cpu_list(value: str) -> List[int]:
+    """Parse a CPU list such as "0-3,8,10-11"."""
+    cpus: List[int] = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def available_cpus() -> List[int]:
+    """CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def runtime_settings(
+    threads: Optional[int] = None,
+    interop_threads: Optional[int] = None,
+    cpu_affinity: Optional[str] = None,
+    autotune: Optional[bool] = None,
+) -> dict:
+    """
+    Merge explicit values over the environment.
+
+    Returns:
+        Settings dictionary for apply_runtime_settings()
+    """
+
+    def env_int(name: str) -> Optional[int]:
+        try:
+            return int(os.environ[name])
+        except (KeyError, ValueError):
+            return None
+
+    affinity = cpu_affinity or os.environ.get(ENV_CPU_AFFINITY)
+    return {
+        "threads": threads or env_int(ENV_THREADS),
+        "interop_threads": interop_threads or env_int(ENV_INTEROP_THREADS),
+        "cpu_affinity": parse_cpu_list(affinity) if affinity else None,
+        "autotune": (
+            autotune
+            if autotune is not None
+            else os.environ.get(ENV_AUTOTUNE, "").lower() in ("1", "true", "yes")
+        ),
+    }
+
+
+def worker_cpus(cpus: List[int], worker_index: int, workers: int) -> List[int]:
+    """Give each worker a contiguous, equally sized share of the CPUs."""
+    share = max(1, len(cpus) // workers)
+    start = (worker_index * share) % len(cpus)
+    return cpus[start : start + share]
+
+
+def apply_runtime_settings(
+    settings: dict, worker_index: Optional[int] = None, workers: int = 1
+) -> dict:
+    """
+    Pin this process and set torch thread pools.
+
+    Args:
+        settings: Output of runtime_settings()
+        worker_index: Index of this worker when the CPUs are shared by a pool
+        workers: Number of workers sharing the CPUs
+
+    Returns:
+        The configuration actually in effect
+    """
+    cpus = settings.get("cpu_affinity")
+    if cpus and worker_index is not None:
+        cpus = worker_cpus(cpus, worker_index, workers)
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except AttributeError:
+            print("CPU affinity is not supported on this platform; ignoring it")
+            cpus = None
+        except OSError as exc:
+            print(f"Cannot pin to CPUs {cpus}: {exc}")
+            cpus = None
+
+    threads = settings.get("threads") or (len(cpus) if cpus else None)
+    if not threads and worker_index is not None and workers > 1:
+        # Unpinned pool workers still shouldn't each claim every core
+        threads = max(1, len(available_cpus()) // workers)
+    if threads:
+        torch.set_num_threads(threads)
+    if settings.get("interop_threads"):
+        try:
+            torch.set_num_interop_threads(settings["interop_threads"])
+        except RuntimeError:
+            # Only allowed before torch starts any inter-op parallel work
+            print("Inter-op threads already initialised; keeping the current count")
+
+    _current.clear()
+    _current.update(
+        {
+            "threads": torch.get_num_threads(),
+            "interop_threads": torch.get_num_interop_threads(),
+            "cpu_affinity": cpus or available_cpus(),
+            "worker_index": worker_index,
+        }
+    )
+    print(format_runtime(_current))
+    return dict(_current)
+
+
+def calibrate(model, thread_counts: List[int], repeats: int = 2) -> Dict[int, float]:
+    """
+    Time one encoder pass plus a short decoder pass at each thread count.
+
+    Returns:
+        Best wall time in seconds per thread count
+    """
+    previous = torch.get_num_threads()
+    mel = torch.zeros(1, model.dims.n_mels, 2 * model.dims.n_audio_ctx, device=model.device)
+    tokens = torch.zeros(1, 16, dtype=torch.long, device=model.device)
+    timings: Dict[int, float] = {}
+    try:
+        with torch.no_grad():
+            model.decoder(tokens, model.encoder(mel))  # warm-up
+            for threads in thread_counts:
+                torch.set_num_threads(threads)
+                best = float("inf")
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    model.decoder(tokens, model.encoder(mel))
+                    best = min(best, time.perf_counter() - started)
+                timings[threads] = best
+    finally:
+        torch.set_num_threads(previous)
+    return timings
+
+
+def autotune(
+    model,
+    model_size: str,
+    cache_file: str,
+    workers: int = 1,
+    retune: bool = False,
+) -> int:
+    """
+    Pick and apply the thread count for model on this host.
+
+    Args:
+        model: Loaded Whisper model to calibrate with
+        model_size: Model size name, part of the persisted key
+        cache_file: JSON file holding previous tuning results
+        workers: Processes sharing this host's CPUs
+        retune: Ignore a persisted result and calibrate again
+
+    Returns:
+        The chosen number of intra-op threads
+    """
+    cpus = len(_current.get("cpu_affinity") or available_cpus())
+    key = f"{platform.node()}|{cpus}|{torch.__version__}|{model_size}|{workers}"
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            tuned = json.load(f)
+    except (OSError, ValueError):
+        tuned = {}
+
+    if key in tuned and not retune:
+        threads = tuned[key]["threads"]
+        source = "persisted"
+    else:
+        budget = max(1, cpus // workers)
+        candidates = sorted({t for t in (1, 2, 4, 8, 16, 32, 64) if t < budget} | {budget})
+        print(f"Calibrating thread count for {model_size} ({candidates})...")
+        timings = calibrate(model, candidates)
+        fastest = min(timings.values())
+        threads = min(t for t, s in timings.items() if s <= fastest * TUNING_TOLERANCE)
+        tuned[key] = {"threads": threads, "timings": timings, "calibrated_at": time.time()}
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temp_path = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(tuned, f, indent=2)
+        os.replace(temp_path, cache_file)
+        source = "calibrated"
+
+    torch.set_num_threads(threads)
+    _current.update({"threads": threads, "autotuned": source, "autotune_model": model_size})
+    print(format_runtime(_current))
+    return threads
+
+
+def current_runtime() -> dict:
+    """Configuration in effect for this process."""
+    return dict(_current)
+
+
+def format_runtime(config: dict) -> str:
+    cpus = config.get("cpu_affinity") or []
+    line = (
+        f"Runtime: threads={config.get('threads')} "
+        f"interop_threads={config.get('interop_threads')} cpus={len(cpus)}"
+    )
+    if config.get("worker_index") is not None:
+        line += f" worker={config['worker_index']}"
+    if config.get("autotuned"):
+        line += f" ({config['autotuned']} for {config['autotune_model']})"
+    return line
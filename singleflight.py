@@ -0,0 +1,73 @@
+"""
+Single-flight coalescing of identical concurrent jobs.
+
+The first caller for a key runs the job; callers arriving with the same key
+while it is in flight wait for and share its result (or its exception).
+Nothing is cached once the job finishes.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """Run at most one job per key at a time and share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Tuple[Future, Any]] = {}
+        self.counters = {"executed": 0, "coalesced": 0}
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Any],
+        on_join: Optional[Callable[[Any], None]] = None,
+        context: Any = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Run fn for key, or join the in-flight run for the same key.
+
+        Args:
+            key: Identity of the job
+            fn: Callable producing the result
+            on_join: Called before waiting when joining an in-flight run, with
+                     the context the run's leader passed
+            context: Shared with callers joining this call's run if it leads
+
+        Returns:
+            (result, shared) where shared is True if another caller ran fn
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                future: Future = Future()
+                self._calls[key] = (future, context)
+                self.counters["executed"] += 1
+            else:
+                future, context = call
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            if on_join is not None:
+                on_join(context)
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def snapshot(self) -> dict:
+        """Counters and the number of jobs in flight, for metrics."""
+        with self._lock:
+            return {"in_flight": len(self._calls), **self.counters}
@@ -0,0 +1,330 @@
+"""
+Speculative (assisted) decoding for Whisper.
+
+A small draft model proposes a few tokens ahead and the large model checks all
+of them in a single batched decoder pass. Tokens are only kept when they match
+the large model's own greedy choice, so the output is the large model's greedy
+decode (up to floating point differences between batched and incremental
+passes), while the number of expensive sequential decoder steps drops.
+
+Only greedy decoding at temperature 0 is accelerated; beam search, sampling
+(temperature fallback) and batched decodes fall back to Whisper's own loop.
+"""
+
+from dataclasses import replace
+from typing import List, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+import whisper
+from torch import Tensor
+from whisper.decoding import DecodingOptions, DecodingTask, GreedyDecoder
+from whisper.tokenizer import Tokenizer, get_tokenizer
+from whisper.transcribe import transcribe as whisper_transcribe
+
+DEFAULT_DRAFT_TOKENS = 4
+
+
+class _KVCache:
+    """Per-layer key/value cache that can be rolled back after rejected drafts."""
+
+    def __init__(self):
+        self.keys: List[Tensor] = []
+        self.values: List[Tensor] = []
+        self.cross: List[Tuple[Tensor, Tensor]] = []
+
+    @property
+    def length(self) -> int:
+        return self.keys[0].shape[1] if self.keys else 0
+
+    def truncate(self, length: int) -> None:
+        self.keys = [k[:, :length] for k in self.keys]
+        self.values = [v[:, :length] for v in self.values]
+
+
+def _attention(attn, q: Tensor, k: Tensor, v: Tensor, mask: Optional[Tensor]) -> Tensor:
+    """Multi-head attention using the weights of a Whisper MultiHeadAttention module."""
+    n_batch, n_ctx, n_state = q.shape
+    scale = (n_state // attn.n_head) ** -0.25
+    q = q.view(n_batch, n_ctx, attn.n_head, -1).permute(0, 2, 1, 3)
+    k = k.view(*k.shape[:2], attn.n_head, -1).permute(0, 2, 3, 1)
+    v = v.view(*v.shape[:2], attn.n_head, -1).permute(0, 2, 1, 3)
+    qk = (q * scale) @ (k * scale)
+    if mask is not None:
+        qk = qk + mask
+    w = F.softmax(qk.float(), dim=-1).to(q.dtype)
+    return attn.out((w @ v).permute(0, 2, 1, 3).flatten(start_dim=2))
+
+
+def decoder_forward(
+    model: whisper.Whisper, tokens: Tensor, audio_features: Tensor, cache: _KVCache
+) -> Tensor:
+    """
+    Run the text decoder on new tokens, appending their keys/values to the cache.
+
+    Unlike Whisper's hook-based cache, any number of new tokens can be fed at
+    once with a correct causal mask, which is what draft verification needs.
+
+    Args:
+        model: Whisper model whose decoder weights are used
+        tokens: New token ids, shape (batch, n_new)
+        audio_features: Encoder output for the audio segment
+        cache: Cache holding keys/values for all previously fed tokens
+
+    Returns:
+        Logits for every new position, shape (batch, n_new, n_vocab)
+    """
+    decoder = model.decoder
+    offset = cache.length
+    n_new = tokens.shape[-1]
+    x = decoder.token_embedding(tokens) + decoder.positional_embedding[offset : offset + n_new]
+    x = x.to(audio_features.dtype)
+
+    mask = None
+    if n_new > 1:
+        mask = torch.full(
+            (n_new, offset + n_new), float("-inf"), device=x.device
+        ).triu_(offset + 1)
+
+    for i, block in enumerate(decoder.blocks):
+        h = block.attn_ln(x)
+        k = block.attn.key(h)
+        v = block.attn.value(h)
+        if i < len(cache.keys):
+            k = torch.cat([cache.keys[i], k], dim=1)
+            v = torch.cat([cache.values[i], v], dim=1)
+            cache.keys[i], cache.values[i] = k, v
+        else:
+            cache.keys.append(k)
+            cache.values.append(v)
+        x = x + _attention(block.attn, block.attn.query(h), k, v, mask)
+
+        if block.cross_attn is not None:
+            if i >= len(cache.cross):
+                cache.cross.append(
+                    (block.cross_attn.key(audio_features), block.cross_attn.value(audio_features))
+                )
+            ck, cv = cache.cross[i]
+            h = block.cross_attn_ln(x)
+            x = x + _attention(block.cross_attn, block.cross_attn.query(h), ck, cv, None)
+
+        x = x + block.mlp(block.mlp_ln(x))
+
+    x = decoder.ln(x)
+    return (x @ torch.transpose(decoder.token_embedding.weight.to(x.dtype), 0, 1)).float()
+
+
+def _vocab_index(target: Tokenizer, draft: Tokenizer, n_vocab: int) -> Tuple[Tensor, Tensor]:
+    """
+    Map every target token id to the draft model's id for the same token.
+
+    Text tokens share ids across multilingual models; special tokens (languages,
+    task markers, timestamps) are matched by name because large-v3 inserts an
+    extra language and shifts everything after it.
+
+    Returns:
+        (index, missing) where missing flags target tokens the draft lacks
+    """
+    index = torch.full((n_vocab,), -1, dtype=torch.long)
+    index[: target.eot] = torch.arange(target.eot)
+    for name, token in target.special_tokens.items():
+        if token < n_vocab and name in draft.special_tokens:
+            index[token] = draft.special_tokens[name]
+    missing = index < 0
+    return index.clamp(min=0), missing
+
+
+def _resample_mel(mel: Tensor, n_mels: int) -> Tensor:
+    """Interpolate log-mel features to another number of mel bins."""
+    return F.interpolate(
+        mel.float().transpose(1, 2), size=n_mels, mode="linear", align_corners=True
+    ).transpose(1, 2)
+
+
+class SpeculativeDecodingTask(DecodingTask):
+    """DecodingTask whose greedy loop verifies tokens drafted by a smaller model."""
+
+    def __init__(
+        self,
+        model: whisper.Whisper,
+        options: DecodingOptions,
+        draft_model: whisper.Whisper,
+        draft_tokens: int = DEFAULT_DRAFT_TOKENS,
+    ):
+        super().__init__(model, options)
+        self.draft_model = draft_model
+        self.draft_tokens = draft_tokens
+        self.stats = {"target_passes": 0, "drafted": 0, "accepted": 0, "generated": 0}
+
+        self.speculative = (
+            draft_model.is_multilingual == model.is_multilingual
+            and isinstance(self.decoder, GreedyDecoder)
+            and options.temperature == 0
+        )
+        if self.speculative:
+            draft_tokenizer = get_tokenizer(
+                draft_model.is_multilingual,
+                num_languages=draft_model.num_languages,
+                language=self.tokenizer.language,
+                task=options.task,
+            )
+            index, missing = _vocab_index(self.tokenizer, draft_tokenizer, model.dims.n_vocab)
+            self._to_draft = index.to(draft_model.device)
+            self._draft_missing = missing.to(draft_model.device)
+            self._draft_features: Optional[Tensor] = None
+
+    def _get_audio_features(self, mel: Tensor) -> Tensor:
+        audio_features = super()._get_audio_features(mel)
+        if self.speculative and mel.shape[0] == 1:
+            draft_mel = mel.to(self.draft_model.device)
+            if draft_mel.shape[-2] != self.draft_model.dims.n_mels:
+                draft_mel = _resample_mel(draft_mel, self.draft_model.dims.n_mels)
+            if self.options.fp16:
+                draft_mel = draft_mel.half()
+            self._draft_features = self.draft_model.encoder(draft_mel)
+        return audio_features
+
+    def _filtered(self, logits: Tensor, tokens: Tensor, drafting: bool = False) -> Tensor:
+        logits = logits.clone()
+        for logit_filter in self.logit_filters:
+            # Filters that keep state about the decoded sequence opt out of
+            # drafts, which the target may still reject
+            if drafting and not getattr(logit_filter, "apply_to_drafts", True):
+                continue
+            logit_filter.apply(logits, tokens)
+        return logits
+
+    def _draft(self, tokens: Tensor, cache: _KVCache, n_tokens: int) -> List[int]:
+        """Greedily propose up to n_tokens continuations of tokens with the draft model."""
+        drafted: List[int] = []
+        pending = tokens[:, cache.length :].to(self.draft_model.device)
+        if self._draft_missing[pending].any():
+            return drafted
+        while len(drafted) < n_tokens:
+            logits = decoder_forward(
+                self.draft_model, self._to_draft[pending], self._draft_features, cache
+            )[:, -1]
+            logits = logits[:, self._to_draft].masked_fill(self._draft_missing, float("-inf"))
+            prefix = torch.cat(
+                [tokens, torch.tensor([drafted], dtype=tokens.dtype, device=tokens.device)], dim=-1
+            )
+            token = int(
+                self._filtered(logits.to(tokens.device), prefix, drafting=True).argmax(dim=-1)
+            )
+            drafted.append(token)
+            if token == self.tokenizer.eot:
+                break
+            pending = torch.tensor([[token]], device=self.draft_model.device)
+        return drafted
+
+    def _main_loop(self, audio_features: Tensor, tokens: Tensor):
+        if not self.speculative or tokens.shape[0] != 1 or self._draft_features is None:
+            return super()._main_loop(audio_features, tokens)
+
+        sum_logprobs = torch.zeros(1, device=audio_features.device)
+        target_cache, draft_cache = _KVCache(), _KVCache()
+        eot = self.tokenizer.eot
+        n_sampled = 0
+
+        def append(token: int, logits: Tensor) -> bool:
+            """Accept one token; return True when decoding should stop."""
+            nonlocal tokens, n_sampled
+            sum_logprobs[0] += F.log_softmax(logits.float(), dim=-1)[0, token]
+            tokens = torch.cat([tokens, tokens.new_tensor([[token]])], dim=-1)
+            n_sampled += 1
+            self.stats["generated"] += 1
+            return token == eot or tokens.shape[-1] > self.n_ctx or n_sampled >= self.sample_len
+
+        logits = decoder_forward(self.model, tokens, audio_features, target_cache)
+        self.stats["target_passes"] += 1
+        no_speech_probs = [float("nan")]
+        if self.tokenizer.no_speech is not None:
+            probs_at_sot = logits[:, self.sot_index].float().softmax(dim=-1)
+            no_speech_probs = probs_at_sot[:, self.tokenizer.no_speech].tolist()
+        pending = self._filtered(logits[:, -1], tokens)
+
+        while not append(int(pending.argmax(dim=-1)), pending):
+            # The target cache covers every token but the one just appended.
+            budget = min(
+                self.draft_tokens,
+                self.n_ctx - tokens.shape[-1],
+                self.sample_len - n_sampled,
+            )
+            drafted = self._draft(tokens, draft_cache, budget) if budget > 0 else []
+            self.stats["drafted"] += len(drafted)
+
+            block = torch.cat([tokens[:, -1:], tokens.new_tensor([drafted])], dim=-1)
+            logits = decoder_forward(self.model, block, audio_features, target_cache)
+            self.stats["target_passes"] += 1
+
+            stop = False
+            for j in range(block.shape[-1]):
+                pending = self._filtered(logits[:, j], tokens)
+                if j == len(drafted) or int(pending.argmax(dim=-1)) != drafted[j]:
+                    break
+                self.stats["accepted"] += 1
+                stop = append(drafted[j], pending)
+                if stop:
+                    break
+            if stop:
+                break
+            target_cache.truncate(tokens.shape[-1])
+            draft_cache.truncate(min(draft_cache.length, tokens.shape[-1]))
+
+        return tokens, sum_logprobs, no_speech_probs
+
+
+class SpeculativeWhisper:
+    """
+    Wrap a Whisper model so that its decoding is assisted by a draft model.
+
+    The wrapper forwards everything else to the wrapped model, so it can be
+    passed anywhere a loaded model is expected (e.g. transcribe_audio).
+    """
+
+    def __init__(
+        self,
+        model: whisper.Whisper,
+        draft_model: whisper.Whisper,
+        draft_tokens: int = DEFAULT_DRAFT_TOKENS,
+    ):
+        self.model = model
+        self.draft_model = draft_model
+        self.draft_tokens = draft_tokens
+        self.stats = {"target_passes": 0, "drafted": 0, "accepted": 0, "generated": 0}
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def __call__(self, *args, **kwargs):
+        return self.model(*args, **kwargs)
+
+    @torch.no_grad()
+    def decode(self, mel: Tensor, options: DecodingOptions = DecodingOptions(), **kwargs):
+        single = mel.ndim == 2
+        if single:
+            mel = mel.unsqueeze(0)
+        if kwargs:
+            options = replace(options, **kwargs)
+
+        result = self.run_task(self.new_task(options), mel)
+        return result[0] if single else result
+
+    def new_task(self, options: DecodingOptions) -> SpeculativeDecodingTask:
+        """Create the decoding task, e.g. for callers adding logit filters."""
+        return SpeculativeDecodingTask(self.model, options, self.draft_model, self.draft_tokens)
+
+    def run_task(self, task: SpeculativeDecodingTask, mel: Tensor):
+        """Run a task from new_task() on a batch of mels and record its statistics."""
+        result = task.run(mel)
+        for key, value in task.stats.items():
+            self.stats[key] += value
+        return result
+
+    def transcribe(self, audio, **kwargs) -> dict:
+        return whisper_transcribe(self, audio, **kwargs)
+
+
+def acceptance_rate(stats: dict) -> float:
+    """Fraction of drafted tokens that the target model accepted."""
+    return stats["accepted"] / stats["drafted"] if stats["drafted"] else 0.0
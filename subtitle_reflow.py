@@ -0,0 +1,282 @@
+"""
+Subtitle reflow: turn Whisper segments into captions that meet line-length and
+reading-speed limits.
+
+Whisper segments are split and merged at word boundaries into cues of at most
+`max_lines` lines of `max_line_chars` characters, shown for between
+`min_duration` and `max_duration` seconds and, where the gap to the next cue
+allows, long enough to stay under `max_cps` characters per second. Cues prefer
+to end at sentence or clause punctuation and always break at speaker changes
+and long pauses.
+
+Word timings come from `word_timestamps=True` when present; otherwise a
+segment's time is spread over its words in proportion to their length.
+
+Every word of a batch of transcripts is laid out in flat numpy arrays and each
+word's furthest allowed and preferred cue end is computed in one vectorized
+pass, leaving only a trivial walk over cues in Python.
+"""
+
+import bisect
+from typing import List, Optional
+
+import numpy as np
+
+# Broadcast-style defaults: two lines of 42 characters, 17 characters per
+# second, and 20 frames (24 fps) minimum display time with a 2-frame gap.
+REFLOW_DEFAULTS = {
+    "max_line_chars": 42,
+    "max_lines": 2,
+    "min_duration": 0.833,
+    "max_duration": 7.0,
+    "max_cps": 17.0,
+    "min_gap": 0.083,
+}
+# A silence this long always ends a cue
+PAUSE_BREAK_SECONDS = 1.5
+# Punctuation-based breaks are only taken once a cue is this full
+MIN_BREAK_FILL = 0.5
+SENTENCE_END = set(".?!…。？！")
+CLAUSE_END = set(",;:、，；")
+
+
+def _flatten(transcripts: List[List[dict]]) -> dict:
+    """Lay out every word of every transcript in flat arrays."""
+    words: List[str] = []
+    starts: List[float] = []
+    ends: List[float] = []
+    word_segment: List[int] = []
+    segment_start: List[float] = []
+    segment_end: List[float] = []
+    segment_doc: List[int] = []
+    segment_speaker: List[Optional[str]] = []
+    interpolate: List[bool] = []
+
+    for doc, segments in enumerate(transcripts):
+        for segment in segments:
+            index = len(segment_start)
+            timed = segment.get("words")
+            if timed:
+                items = [w["word"] for w in timed]
+                starts.extend(w["start"] for w in timed)
+                ends.extend(w["end"] for w in timed)
+            else:
+                items = [" " + w for w in segment["text"].split()]
+                starts.extend([0.0] * len(items))
+                ends.extend([0.0] * len(items))
+            if not items:
+                continue
+            words.extend(items)
+            word_segment.extend([index] * len(items))
+            segment_start.append(segment["start"])
+            segment_end.append(segment["end"])
+            segment_doc.append(doc)
+            segment_speaker.append(segment.get("speaker"))
+            interpolate.append(not timed)
+
+    lengths = np.fromiter((len(w) for w in words), dtype=np.int64, count=len(words))
+    start = np.array(starts, dtype=np.float64)
+    end = np.array(ends, dtype=np.float64)
+    seg = np.array(word_segment, dtype=np.int64)
+
+    # Spread untimed segments' durations over their words by character count
+    interp = np.array(interpolate, dtype=bool)
+    if interp.any():
+        cumulative = np.cumsum(lengths)
+        first = np.searchsorted(seg, np.arange(len(segment_start)))
+        before = cumulative[first] - lengths[first]
+        within_end = cumulative - before[seg]
+        totals = within_end[np.append(first[1:], len(seg)) - 1]
+        seg_start = np.array(segment_start)
+        duration = np.array(segment_end) - seg_start
+        mask = interp[seg]
+        scale = duration[seg][mask] / np.maximum(totals[seg][mask], 1)
+        start[mask] = seg_start[seg][mask] + (within_end - lengths)[mask] * scale
+        end[mask] = seg_start[seg][mask] + within_end[mask] * scale
+
+    speaker_codes: dict = {}
+    codes = [speaker_codes.setdefault(s, len(speaker_codes)) for s in segment_speaker]
+    return {
+        "words": words,
+        "lengths": lengths,
+        "start": start,
+        "end": end,
+        "doc": np.array(segment_doc, dtype=np.int64)[seg] if len(seg) else seg,
+        "speaker": np.array(codes, dtype=np.int64)[seg] if len(seg) else seg,
+        "speaker_names": segment_speaker,
+        "segment": seg,
+    }
+
+
+def _cue_ends(flat: dict, settings: dict) -> np.ndarray:
+    """For every word, the index one past the last word of a cue starting there."""
+    n = len(flat["words"])
+    index = np.arange(n)
+    words = flat["words"]
+    lengths = flat["lengths"]
+    # Leading spaces don't count towards a cue's length
+    lead = np.fromiter((w[:1] == " " for w in words), dtype=np.int64, count=n)
+    chars = np.concatenate([[0], np.cumsum(lengths)])
+    end = np.maximum.accumulate(flat["end"])
+
+    # Forced boundaries: new transcript, new speaker, long pause
+    speaker = flat["speaker"]
+    forced = np.zeros(n, dtype=bool)
+    forced[1:] = (
+        (flat["doc"][1:] != flat["doc"][:-1])
+        | (speaker[1:] != speaker[:-1])
+        | (flat["start"][1:] - flat["end"][:-1] >= PAUSE_BREAK_SECONDS)
+    )
+    boundaries = np.append(np.flatnonzero(forced), n)
+    hard = boundaries[np.searchsorted(boundaries, index, side="right")]
+
+    limit = settings["max_line_chars"] * settings["max_lines"]
+    by_chars = np.searchsorted(chars, chars[index] + lead + limit, side="right") - 1
+    by_time = np.searchsorted(end, flat["start"] + settings["max_duration"], side="right")
+    furthest = np.maximum(index + 1, np.minimum(np.minimum(by_chars, by_time), hard))
+
+    # Prefer ending after sentence punctuation, then clause punctuation, once
+    # the cue is reasonably full; forced boundaries are always taken as is
+    final = [w.rstrip("\"')]»”")[-1:] for w in words]
+    preferred = furthest.copy()
+    min_end = np.searchsorted(chars, chars[index] + lead + MIN_BREAK_FILL * limit, side="left")
+    for marks in (CLAUSE_END, SENTENCE_END):
+        breaks = np.flatnonzero(np.fromiter(
+            (c in marks for c in final), dtype=bool, count=n
+        )) + 1
+        if not len(breaks):
+            continue
+        candidate = breaks[np.maximum(np.searchsorted(breaks, furthest, side="right") - 1, 0)]
+        usable = (candidate <= furthest) & (candidate > index) & (candidate >= min_end)
+        usable &= furthest < hard
+        preferred = np.where(usable, candidate, preferred)
+    return preferred
+
+
+def _fill_lines(chars: List[int], lead: List[int], first: int, last: int,
+                width: int, max_lines: int) -> List[int]:
+    """
+    Greedily fill up to max_lines lines with words[first:last].
+
+    Returns:
+        Line start indices followed by the end of the last line, which is
+        last if everything fit
+    """
+    breaks = [first]
+    while breaks[-1] < last and len(breaks) <= max_lines:
+        start = breaks[-1]
+        k = bisect.bisect_right(chars, chars[start] + lead[start] + width, start + 1, last + 1)
+        breaks.append(max(k - 1, start + 1))
+    return breaks
+
+
+def _split_lines(words: List[str], chars: List[int], lead: List[int], first: int,
+                 last: int, width: int, max_lines: int) -> List[str]:
+    """Split words[first:last] into as few lines as fit, balancing two-line cues."""
+    breaks = _fill_lines(chars, lead, first, last, width, max_lines)
+    if len(breaks) == 3:
+        # Pick the split that makes the longer line shortest
+        k = min(
+            range(first + 1, last),
+            key=lambda k: max(
+                chars[k] - chars[first] - lead[first], chars[last] - chars[k] - lead[k]
+            ),
+        )
+        breaks = [first, k, last]
+    breaks[-1] = last
+    return ["".join(words[a:b]).strip() for a, b in zip(breaks, breaks[1:])]
+
+
+def reflow_batch(
+    transcripts: List[List[dict]], settings: Optional[dict] = None
+) -> List[List[dict]]:
+    """
+    Reflow several transcripts in one pass.
+
+    Args:
+        transcripts: One list of Whisper segments per transcript
+        settings: Overrides for REFLOW_DEFAULTS
+
+    Returns:
+        One list of cues per transcript; each cue has "start", "end", "text"
+        (lines joined by newlines), "lines" and, if known, "speaker"
+    """
+    settings = {**REFLOW_DEFAULTS, **(settings or {})}
+    flat = _flatten(transcripts)
+    results: List[List[dict]] = [[] for _ in transcripts]
+    n = len(flat["words"])
+    if n == 0:
+        return results
+
+    preferred = _cue_ends(flat, settings)
+    words = flat["words"]
+    chars = [0, *np.cumsum(flat["lengths"]).tolist()]
+    lead = [int(w[:1] == " ") for w in words]
+    width, max_lines = settings["max_line_chars"], settings["max_lines"]
+
+    # Walk the precomputed cue ends, shortening cues whose words don't wrap
+    # into the line limits; merge a cue into the previous one when it would
+    # otherwise flash by too quickly and the two fit together
+    spans: List[List[int]] = []
+    starts, ends = flat["start"], flat["end"]
+    i = 0
+    while i < n:
+        j = _fill_lines(chars, lead, i, int(preferred[i]), width, max_lines)[-1]
+        if spans:
+            a, b = spans[-1]
+            short = ends[j - 1] - starts[i] < settings["min_duration"]
+            if (
+                short
+                and flat["doc"][a] == flat["doc"][i]
+                and flat["speaker"][a] == flat["speaker"][i]
+                and _fill_lines(chars, lead, a, j, width, max_lines)[-1] == j
+                and ends[j - 1] - starts[a] <= settings["max_duration"]
+                and starts[i] - ends[b - 1] < PAUSE_BREAK_SECONDS
+            ):
+                spans[-1][1] = j
+                i = j
+                continue
+        spans.append([i, j])
+        i = j
+
+    # Display times, vectorized over cues: stretch short or fast cues into
+    # the following gap, never overlapping the next cue
+    first = np.array([s[0] for s in spans])
+    last = np.array([s[1] for s in spans])
+    cue_start = starts[first]
+    cue_end = np.maximum(np.maximum.accumulate(ends)[last - 1], cue_start + 0.01)
+    cue_chars = np.array(chars)[last] - np.array(chars)[first]
+    wanted = cue_start + np.maximum(settings["min_duration"], cue_chars / settings["max_cps"])
+    next_start = np.append(cue_start[1:], np.inf)
+    same_doc = np.append(flat["doc"][first[1:]] == flat["doc"][first[:-1]], False)
+    ceiling = np.where(same_doc, next_start - settings["min_gap"], np.inf)
+    ceiling = np.minimum(ceiling, cue_start + settings["max_duration"])
+    cue_end = np.maximum(cue_end, np.minimum(wanted, ceiling))
+    cue_end = np.minimum(cue_end, np.where(same_doc, next_start, np.inf))
+
+    for k, (a, b) in enumerate(spans):
+        lines = _split_lines(words, chars, lead, a, b, width, max_lines)
+        cue = {
+            "start": float(cue_start[k]),
+            "end": float(cue_end[k]),
+            "text": "\n".join(lines),
+            "lines": lines,
+        }
+        speaker = flat["speaker_names"][flat["segment"][a]]
+        if speaker is not None:
+            cue["speaker"] = speaker
+        results[int(flat["doc"][a])].append(cue)
+    return results
+
+
+def reflow(segments: List[dict], settings: Optional[dict] = None) -> List[dict]:
+    """Reflow one transcript's segments into subtitle cues (see reflow_batch)."""
+    return reflow_batch([segments], settings)[0]
+
+
+def reading_speed_violations(cues: List[dict], max_cps: float) -> int:
+    """Number of cues shown too briefly for their length."""
+    return sum(
+        1 for cue in cues
+        if sum(len(line) for line in cue["lines"]) > max_cps * (cue["end"] - cue["start"]) + 1e-6
+    )
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Benchmark tooling for WhisperTrans.
+
+Each subcommand measures one performance feature against its baseline on a
+local audio file and prints a small table. Use --json to keep the numbers for
+comparison between versions.
+
+Usage:
+    python tools/benchmark.py speculative audio.wav --model medium --draft-model tiny
+    python tools/benchmark.py profiles audio.wav --model small
+    python tools/benchmark.py reflow --hours 10
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import whisper  # noqa: E402
+
+from speculative_decoding import SpeculativeWhisper, acceptance_rate  # noqa: E402
+from subtitle_reflow import (  # noqa: E402
+    REFLOW_DEFAULTS,
+    reading_speed_violations,
+    reflow_batch,
+)
+from whisper_trans import (  # noqa: E402
+    DECODE_PROFILES,
+    SAMPLE_RATE,
+    SUPPORTED_MODELS,
+    load_whisper_model,
+    resolve_decode_options,
+    summarize_fallbacks,
+)
+
+
+def timed_transcribe(model, audio, **options):
+    """Transcribe and return (result, wall seconds, generated tokens)."""
+    started = time.perf_counter()
+    result = model.transcribe(audio, verbose=None, **options)
+    seconds = time.perf_counter() - started
+    tokens = sum(len(segment["tokens"]) for segment in result["segments"])
+    return result, seconds, tokens
+
+
+def measurement(seconds: float, tokens: int, audio_seconds: float) -> dict:
+    return {
+        "seconds": seconds,
+        "tokens": tokens,
+        "tokens_per_second": tokens / seconds if seconds else 0.0,
+        "rtf": seconds / audio_seconds if audio_seconds else 0.0,
+    }
+
+
+def print_table(rows: dict) -> None:
+    print(f"\n{'run':<24}{'seconds':>10}{'tokens':>9}{'tok/s':>9}{'RTF':>8}")
+    for name, row in rows.items():
+        print(
+            f"{name:<24}{row['seconds']:>10.2f}{row['tokens']:>9d}"
+            f"{row['tokens_per_second']:>9.1f}{row['rtf']:>8.3f}"
+        )
+
+
+def bench_speculative(args) -> dict:
+    audio = whisper.load_audio(args.audio_file)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    model = load_whisper_model(args.model)
+    draft = load_whisper_model(args.draft_model)
+    options = {"language": args.language, "temperature": 0.0}
+
+    # Warm up so the first timed run does not pay for allocation
+    model.transcribe(audio[: SAMPLE_RATE * 5], verbose=None, **options)
+
+    plain, plain_seconds, plain_tokens = timed_transcribe(model, audio, **options)
+    speculative_model = SpeculativeWhisper(model, draft, args.draft_tokens)
+    speculative, spec_seconds, spec_tokens = timed_transcribe(
+        speculative_model, audio, **options
+    )
+
+    rows = {
+        f"plain ({args.model})": measurement(plain_seconds, plain_tokens, audio_seconds),
+        f"speculative (+{args.draft_model})": measurement(
+            spec_seconds, spec_tokens, audio_seconds
+        ),
+    }
+    print_table(rows)
+    print(f"\nSpeedup:          {plain_seconds / spec_seconds:.2f}x")
+    print(f"Acceptance rate:  {acceptance_rate(speculative_model.stats):.1%}")
+    print(f"Identical output: {plain['text'] == speculative['text']}")
+
+    return {
+        "audio_seconds": audio_seconds,
+        "runs": rows,
+        "stats": speculative_model.stats,
+        "identical_output": plain["text"] == speculative["text"],
+    }
+
+
+def bench_profiles(args) -> dict:
+    audio = whisper.load_audio(args.audio_file)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    model = load_whisper_model(args.model)
+    model.transcribe(audio[: SAMPLE_RATE * 5], verbose=None, temperature=0.0)
+
+    rows = {}
+    fallbacks = {}
+    for profile in args.profiles:
+        options = resolve_decode_options(profile)
+        result, seconds, tokens = timed_transcribe(
+            model, audio, language=args.language, **options
+        )
+        rows[profile] = measurement(seconds, tokens, audio_seconds)
+        fallbacks[profile] = summarize_fallbacks(result["segments"], options["temperature"])
+        rows[profile].update(fallbacks[profile])
+
+    print_table(rows)
+    print(f"\n{'profile':<24}{'windows':>10}{'retried':>9}{'retries':>9}")
+    for profile, row in fallbacks.items():
+        print(
+            f"{profile:<24}{row['windows']:>10d}{row['fallback_windows']:>9d}"
+            f"{row['fallback_retries']:>9d}"
+        )
+
+    return {"audio_seconds": audio_seconds, "model": args.model, "runs": rows}
+
+
+def synthetic_transcript(hours: float, word_timestamps: bool, seed: int = 0) -> list:
+    """Whisper-like segments of random words at a conversational pace."""
+    rng = random.Random(seed)
+    vocabulary = (
+        "the a and to of in that it is was you for on are with as they be at this "
+        "have from or one had by word but not what all were we when your can said "
+        "there use each which she do how their if will up other about out many then "
+        "them these so some her would make like him into time has look two more "
+        "understanding responsibility, development. information? really! yes, okay."
+    ).split()
+    segments = []
+    time_cursor = 0.0
+    while time_cursor < hours * 3600:
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(4, 40))]
+        pace = rng.uniform(0.25, 0.45)
+        segment = {
+            "start": time_cursor,
+            "end": time_cursor + pace * len(words),
+            "text": " " + " ".join(words),
+            "speaker": f"SPEAKER_{rng.randint(1, 2)}",
+        }
+        if word_timestamps:
+            segment["words"] = [
+                {"word": " " + word, "start": time_cursor + k * pace,
+                 "end": time_cursor + (k + 0.9) * pace}
+                for k, word in enumerate(words)
+            ]
+        segments.append(segment)
+        time_cursor = segment["end"] + rng.choice([0.1, 0.3, 0.8, 2.0])
+    return segments
+
+
+def bench_reflow(args) -> dict:
+    if args.transcripts:
+        transcripts = []
+        for path in args.transcripts:
+            with open(path, "r", encoding="utf-8") as f:
+                transcripts.append(json.load(f)["segments"])
+    else:
+        transcripts = [synthetic_transcript(args.hours, args.word_timestamps)]
+    settings = {**REFLOW_DEFAULTS, "max_line_chars": args.max_line_chars}
+    words = sum(len(s["text"].split()) for segments in transcripts for s in segments)
+    audio_seconds = sum(segments[-1]["end"] for segments in transcripts if segments)
+
+    reflow_batch(transcripts, settings)  # warm-up
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        cues = reflow_batch(transcripts, settings)
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    all_cues = [cue for batch in cues for cue in batch]
+    row = {
+        "transcripts": len(transcripts),
+        "audio_hours": audio_seconds / 3600,
+        "segments": sum(len(segments) for segments in transcripts),
+        "words": words,
+        "cues": len(all_cues),
+        "seconds": best,
+        "words_per_second": words / best if best else 0.0,
+        "longest_line": max((len(line) for cue in all_cues for line in cue["lines"]), default=0),
+        "reading_speed_violations": sum(
+            reading_speed_violations(batch, settings["max_cps"]) for batch in cues
+        ),
+    }
+    print(
+        f"\nReflowed {row['words']} words ({row['audio_hours']:.1f} h, "
+        f"{row['segments']} segments) into {row['cues']} cues in {best * 1000:.0f} ms "
+        f"(best of {args.repeat}, {row['words_per_second']:,.0f} words/s)"
+    )
+    print(
+        f"Longest line {row['longest_line']} chars; "
+        f"{row['reading_speed_violations']} cues over {settings['max_cps']:g} chars/s"
+    )
+    return {"settings": settings, "runs": {"reflow": row}}
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", help="Write results to this JSON file")
+
+    parser = argparse.ArgumentParser(description="WhisperTrans benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    speculative = subparsers.add_parser(
+        "speculative", parents=[common], help="Speculative decoding vs. plain greedy decoding"
+    )
+    speculative.add_argument("audio_file", help="Path to the audio file")
+    speculative.add_argument("-m", "--model", default="medium", choices=SUPPORTED_MODELS)
+    speculative.add_argument("--draft-model", default="tiny", choices=SUPPORTED_MODELS)
+    speculative.add_argument("--draft-tokens", type=int, default=4)
+    speculative.add_argument("-l", "--language", help="Language of the audio")
+    speculative.set_defaults(run=bench_speculative)
+
+    profiles = subparsers.add_parser(
+        "profiles", parents=[common], help="Decode profiles and their fallback retries"
+    )
+    profiles.add_argument("audio_file", help="Path to the audio file")
+    profiles.add_argument("-m", "--model", default="base", choices=SUPPORTED_MODELS)
+    profiles.add_argument("--profiles", nargs="+", default=list(DECODE_PROFILES),
+                          choices=list(DECODE_PROFILES))
+    profiles.add_argument("-l", "--language", help="Language of the audio")
+    profiles.set_defaults(run=bench_profiles)
+
+    reflow = subparsers.add_parser(
+        "reflow", parents=[common], help="Subtitle reflow throughput (no model needed)"
+    )
+    reflow.add_argument("transcripts", nargs="*",
+                        help="JSON transcripts with segments (default: synthetic)")
+    reflow.add_argument("--hours", type=float, default=10.0,
+                        help="Length of the synthetic transcript")
+    reflow.add_argument("--word-timestamps", action="store_true",
+                        help="Give the synthetic transcript word timings")
+    reflow.add_argument("--max-line-chars", type=int, default=REFLOW_DEFAULTS["max_line_chars"])
+    reflow.add_argument("--repeat", type=int, default=5)
+    reflow.set_defaults(run=bench_reflow)
+
+    args = parser.parse_args()
+    results = {"benchmark": args.benchmark, **args.run(args)}
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Load generator and regression check for the WhisperTrans web server.
+
+Replays a mix of audio files against the JSON API at a fixed concurrency
+(closed loop) or a Poisson arrival rate (open loop), samples the server's
+/metrics endpoint for memory and queue depth while it runs, and reports
+p50/p95/p99 latency, throughput, error and rejection rates.
+
+Without --url a server is started with a stub model: each transcription
+decodes the upload as usual, then sleeps for the audio duration times
+--stub-rtf instead of running Whisper. Admission control, single-flight,
+output formatting and the HTTP stack are the real ones, and timings are
+repeatable, so results from two versions can be compared with --baseline.
+
+Usage:
+    python tools/loadtest.py run samples/*.wav --concurrency 8 --requests 200
+    python tools/loadtest.py run a.wav:3 b.mp3:1 --rate 2 --duration 120 --json after.json
+    python tools/loadtest.py run samples/*.wav --rate 2 --baseline before.json
+    python tools/loadtest.py run samples/*.wav --url http://127.0.0.1:5000  # real server
+    python tools/loadtest.py serve --port 5001 --stub-rtf 0.05
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+# Relative worsening beyond --tolerance that counts as a regression, per
+# metric: True if larger is worse
+REGRESSION_METRICS = {
+    "p50_seconds": True,
+    "p95_seconds": True,
+    "p99_seconds": True,
+    "throughput_rps": False,
+}
+# Error rate may rise by this much (absolute) before it counts as a regression
+ERROR_RATE_SLACK = 0.01
+
+
+def stub_transcribe_audio(rtf: float):
+    """A transcribe_audio() replacement that sleeps instead of running Whisper."""
+    from audio_preprocessing import load_audio
+    from whisper_trans import SAMPLE_RATE
+
+    def transcribe_audio(model, audio_file, language=None, verbose=False,
+                         word_timestamps=False, **options):
+        audio, report = load_audio(audio_file)
+        audio_seconds = len(audio) / SAMPLE_RATE
+        started = time.perf_counter()
+        time.sleep(audio_seconds * rtf)
+
+        segments = []
+        for index, start in enumerate(range(0, max(1, int(audio_seconds)), 5)):
+            end = min(start + 5.0, audio_seconds)
+            segment = {"id": index, "start": float(start), "end": end,
+                       "text": f" Segment {index} of the load test transcript."}
+            if word_timestamps:
+                words = segment["text"].split()
+                step = (end - start) / len(words)
+                segment["words"] = [
+                    {"word": " " + word, "start": start + k * step, "end": start + (k + 1) * step}
+                    for k, word in enumerate(words)
+                ]
+            segments.append(segment)
+        return {
+            "text": "".join(s["text"] for s in segments),
+            "language": language or "en",
+            "segments": segments,
+            "timing": {
+                "audio_source": report["source"],
+                "decode_seconds": report["decode_seconds"],
+                "inference_seconds": time.perf_counter() - started,
+                "audio_seconds": audio_seconds,
+            },
+        }
+
+    return transcribe_audio
+
+
+def serve(args) -> None:
+    """Run the web app with the stub model (no browser, lock file or heartbeat)."""
+    import web_app
+
+    web_app.load_whisper_model = lambda *args, **kwargs: None
+    web_app.transcribe_audio = stub_transcribe_audio(args.stub_rtf)
+    print(f"Stub server (RTF {args.stub_rtf:g}) on http://127.0.0.1:{args.port}")
+    web_app.app.run(host="127.0.0.1", port=args.port, threaded=True, use_reloader=False)
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub_server(args) -> Tuple[subprocess.Popen, str]:
+    """Start `serve` in a subprocess and wait until it answers."""
+    port = free_port()
+    env = {
+        **os.environ,
+        "TRANSCRIBE_WORKERS": str(args.workers),
+        "MAX_BACKLOG_SECONDS": str(args.max_backlog),
+        "MAX_CLIENT_JOBS": str(args.max_client_jobs),
+        # Simulated clients are told apart by X-Client-Id, all from localhost
+        "TRUST_CLIENT_ID_HEADER": "1",
+    }
+    process = subprocess.Popen(
+        [sys.executable, __file__, "serve", "--port", str(port), "--stub-rtf", str(args.stub_rtf)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Stub server exited during startup")
+        try:
+            with urllib.request.urlopen(f"{url}/api/models", timeout=1):
+                return process, url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Stub server did not start within 60 seconds")
+
+
+def parse_mix(specs: List[str]) -> List[Tuple[str, float]]:
+    """Parse "file" or "file:weight" arguments."""
+    mix = []
+    for spec in specs:
+        path, _, weight = spec.rpartition(":")
+        if not path or not weight.replace(".", "", 1).isdigit():
+            path, weight = spec, "1"
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Audio file not found: {path}")
+        mix.append((path, float(weight)))
+    return mix
+
+
+def send(url: str, path: str, body: bytes, client: str, args) -> dict:
+    """Submit one file and wait for its result."""
+    query = {"filename": os.path.basename(path), "wait": "true",
+             "model": args.model, "format": args.format}
+    if args.reflow:
+        query["reflow"] = "true"
+    request = urllib.request.Request(
+        f"{url}/api/transcriptions?{urllib.parse.urlencode(query)}",
+        data=body,
+        method="POST",
+        headers={"Content-Type": "application/octet-stream", "X-Client-Id": client},
+    )
+    outcome = {"file": os.path.basename(path)}
+    try:
+        with urllib.request.urlopen(request, timeout=args.timeout) as response:
+            job = json.load(response)
+            outcome["status"] = response.status
+            outcome["outcome"] = "ok" if job.get("status") == "completed" else "error"
+    except urllib.error.HTTPError as exc:
+        outcome["status"] = exc.code
+        outcome["outcome"] = "rejected" if exc.code == 429 else "error"
+    except (urllib.error.URLError, OSError) as exc:
+        outcome["status"] = None
+        outcome["outcome"] = "error"
+        outcome["error"] = str(exc)
+    return outcome
+
+
+def sample_metrics(url: str, started: float, interval: float, stop: threading.Event,
+                   samples: List[dict]) -> None:
+    """Record server memory and queue state every interval seconds."""
+    while True:
+        try:
+            with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+                metrics = json.load(response)
+            memory = metrics.get("memory", {})
+            admission = metrics.get("admission", {})
+            singleflight = metrics.get("singleflight", {})
+            samples.append({
+                "t": time.perf_counter() - started,
+                "rss_bytes": memory.get("rss_bytes"),
+                "peak_rss_bytes": memory.get("peak_rss_bytes"),
+                "running": admission.get("running"),
+                "queued": admission.get("queued"),
+                "backlog_seconds": admission.get("backlog_seconds"),
+                "coalesced": singleflight.get("coalesced"),
+            })
+        except (urllib.error.URLError, OSError, ValueError):
+            pass
+        if stop.wait(interval):
+            return
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile, q in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def run_load(url: str, mix: List[Tuple[str, float]], args) -> dict:
+    """Replay the mix and collect per-request outcomes and metrics samples."""
+    rng = random.Random(args.seed)
+    bodies = {path: Path(path).read_bytes() for path, _ in mix}
+    paths = [path for path, _ in mix]
+    weights = [weight for _, weight in mix]
+    requests: List[dict] = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def job(index: int, path: str, scheduled: float) -> None:
+        # Latency runs from the scheduled arrival, so time spent waiting for a
+        # free client slot counts (no coordinated omission)
+        body = bodies[path]
+        if args.unique:
+            # Trailing bytes change the content hash, so single-flight does
+            # not coalesce repeats; WAV readers and ffmpeg ignore them
+            body += b"LOADTEST" + index.to_bytes(8, "little")
+        outcome = send(url, path, body, f"loadtest-{index % args.clients}", args)
+        outcome["start"] = scheduled - started
+        outcome["latency"] = time.perf_counter() - scheduled
+        with lock:
+            requests.append(outcome)
+
+    samples: List[dict] = []
+    stop = threading.Event()
+    sampler = threading.Thread(
+        target=sample_metrics, args=(url, started, args.sample_interval, stop, samples), daemon=True
+    )
+    sampler.start()
+
+    def more(index: int) -> bool:
+        if args.requests is not None:
+            return index < args.requests
+        return time.perf_counter() - started < args.duration
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        index = 0
+        if args.rate:
+            # Open loop: Poisson arrivals, at most --concurrency in flight
+            next_arrival = started
+            while more(index):
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(job, index, rng.choices(paths, weights)[0], next_arrival)
+                index += 1
+                next_arrival += rng.expovariate(args.rate)
+        else:
+            # Closed loop: each of --concurrency clients sends back to back
+            counter = iter(range(1 << 62))
+            choose = threading.Lock()
+
+            def client_loop() -> None:
+                while True:
+                    with choose:
+                        i = next(counter)
+                        if not more(i):
+                            return
+                        path = rng.choices(paths, weights)[0]
+                    job(i, path, time.perf_counter())
+
+            for _ in range(args.concurrency):
+                pool.submit(client_loop)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+    return {"elapsed": elapsed, "requests": requests, "samples": samples}
+
+
+def summarize(load: dict) -> dict:
+    requests = load["requests"]
+    total = len(requests)
+    ok = [r for r in requests if r["outcome"] == "ok"]
+    latencies = [r["latency"] for r in ok]
+    errors = sum(1 for r in requests if r["outcome"] == "error")
+    rejected = sum(1 for r in requests if r["outcome"] == "rejected")
+    rss = [s["rss_bytes"] for s in load["samples"] if s["rss_bytes"] is not None]
+    peak = [s["peak_rss_bytes"] for s in load["samples"] if s["peak_rss_bytes"] is not None]
+    coalesced = [s["coalesced"] for s in load["samples"] if s["coalesced"] is not None]
+    return {
+        "requests": total,
+        "completed": len(ok),
+        "errors": errors,
+        "rejected": rejected,
+        "error_rate": errors / total if total else 0.0,
+        "rejection_rate": rejected / total if total else 0.0,
+        "elapsed_seconds": load["elapsed"],
+        "throughput_rps": len(ok) / load["elapsed"] if load["elapsed"] else 0.0,
+        "p50_seconds": percentile(latencies, 50),
+        "p95_seconds": percentile(latencies, 95),
+        "p99_seconds": percentile(latencies, 99),
+        "max_seconds": max(latencies, default=None),
+        "rss_start_bytes": rss[0] if rss else None,
+        "rss_end_bytes": rss[-1] if rss else None,
+        "rss_max_bytes": max(rss) if rss else None,
+        "peak_rss_bytes": max(peak) if peak else None,
+        "coalesced": coalesced[-1] - coalesced[0] if coalesced else None,
+    }
+
+
+def print_summary(summary: dict) -> None:
+    def seconds(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.3f}s"
+
+    def megabytes(value: Optional[int]) -> str:
+        return "-" if value is None else f"{value / 1e6:.0f} MB"
+
+    print(
+        f"\n{summary['requests']} requests in {summary['elapsed_seconds']:.1f}s: "
+        f"{summary['completed']} completed, {summary['rejected']} rejected (429), "
+        f"{summary['errors']} errors ({summary['error_rate']:.1%})"
+    )
+    print(
+        f"Throughput: {summary['throughput_rps']:.2f} completed requests/s"
+        + (f" ({summary['coalesced']} coalesced)" if summary["coalesced"] else "")
+    )
+    print(
+        f"Latency:    p50 {seconds(summary['p50_seconds'])}  p95 {seconds(summary['p95_seconds'])}"
+        f"  p99 {seconds(summary['p99_seconds'])}  max {seconds(summary['max_seconds'])}"
+    )
+    print(
+        f"Server RSS: start {megabytes(summary['rss_start_bytes'])}, "
+        f"end {megabytes(summary['rss_end_bytes'])}, max {megabytes(summary['rss_max_bytes'])} "
+        f"(peak {megabytes(summary['peak_rss_bytes'])})"
+    )
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Compare against a baseline run's summary.
+
+    Returns:
+        Regressions found (empty if none)
+    """
+    regressions = []
+    print(f"\n{'metric':<16}{'baseline':>12}{'current':>12}{'change':>9}")
+    for metric, larger_is_worse in REGRESSION_METRICS.items():
+        before, after = baseline.get(metric), summary.get(metric)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        print(f"{metric:<16}{before:>12.3f}{after:>12.3f}{change:>+9.1%}")
+        if (change if larger_is_worse else -change) > tolerance:
+            regressions.append(f"{metric} {before:.3f} -> {after:.3f} ({change:+.1%})")
+    before, after = baseline.get("error_rate", 0.0), summary["error_rate"]
+    print(f"{'error_rate':<16}{before:>12.3f}{after:>12.3f}")
+    if after > before + ERROR_RATE_SLACK:
+        regressions.append(f"error_rate {before:.1%} -> {after:.1%}")
+    return regressions
+
+
+def run(args) -> None:
+    mix = parse_mix(args.files)
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_stub_server(args)
+    url = url.rstrip("/")
+    mode = f"{args.rate:g} req/s arrivals" if args.rate else "closed loop"
+    limit = f"{args.requests} requests" if args.requests is not None else f"{args.duration:g}s"
+    print(f"Load test against {url}: {args.concurrency} concurrent, {mode}, {limit}")
+
+    try:
+        load = run_load(url, mix, args)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    summary = summarize(load)
+    print_summary(summary)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(summary, json.load(f)["summary"], args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+
+    if args.json:
+        config = {k: v for k, v in vars(args).items() if k not in ("run", "json", "baseline")}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "config": {**config, "url": url, "stub": process is not None},
+                    "summary": summary,
+                    "memory": load["samples"],
+                    "requests": sorted(load["requests"], key=lambda r: r["start"]),
+                },
+                f,
+                indent=2,
+            )
+        print(f"\nResults saved to {args.json}")
+    if regressions:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WhisperTrans web server load test")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Replay audio files against the server")
+    run_parser.add_argument("files", nargs="+", metavar="FILE[:WEIGHT]",
+                            help="Audio files to replay, optionally weighted (default weight 1)")
+    run_parser.add_argument("--url", help="Server to test (default: start a stub-model server)")
+    run_parser.add_argument("-c", "--concurrency", type=int, default=4,
+                            help="Requests in flight at most (default: 4)")
+    run_parser.add_argument("--rate", type=float,
+                            help="Poisson arrival rate in requests/s (default: closed loop)")
+    run_parser.add_argument("--duration", type=float, default=60.0,
+                            help="Seconds to generate load for (default: 60)")
+    run_parser.add_argument("-n", "--requests", type=int,
+                            help="Send this many requests instead of running for --duration")
+    run_parser.add_argument("--clients", type=int, default=4,
+                            help="Distinct X-Client-Id values to spread requests over "
+                                 "(a --url server needs TRUST_CLIENT_ID_HEADER=1)")
+    run_parser.add_argument("--unique", action="store_true",
+                            help="Make every upload distinct so repeats are not coalesced")
+    run_parser.add_argument("-m", "--model", default="base")
+    run_parser.add_argument("-f", "--format", default="txt")
+    run_parser.add_argument("--reflow", action="store_true", help="Request subtitle reflow")
+    run_parser.add_argument("--timeout", type=float, default=600.0,
+                            help="Per-request timeout in seconds")
+    run_parser.add_argument("--sample-interval", type=float, default=1.0,
+                            help="Seconds between /metrics samples")
+    run_parser.add_argument("--seed", type=int, default=0, help="Seed for file choice and arrivals")
+    run_parser.add_argument("--stub-rtf", type=float, default=0.05,
+                            help="Stub server: processing seconds per audio second")
+    run_parser.add_argument("--workers", type=int, default=1,
+                            help="Stub server: TRANSCRIBE_WORKERS")
+    run_parser.add_argument("--max-backlog", type=float, default=3600.0,
+                            help="Stub server: MAX_BACKLOG_SECONDS")
+    run_parser.add_argument("--max-client-jobs", type=int, default=2,
+                            help="Stub server: MAX_CLIENT_JOBS")
+    run_parser.add_argument("--json", help="Write the summary, memory samples and requests here")
+    run_parser.add_argument("--baseline", help="Earlier --json result to check for regressions")
+    run_parser.add_argument("--tolerance", type=float, default=0.1,
+                            help="Relative slowdown allowed against --baseline (default: 0.1)")
+    run_parser.set_defaults(run=run)
+
+    serve_parser = subparsers.add_parser("serve", help="Run the web server with the stub model")
+    serve_parser.add_argument("--port", type=int, default=5001)
+    serve_parser.add_argument("--stub-rtf", type=float, default=0.05,
+                              help="Processing seconds per audio second")
+    serve_parser.set_defaults(run=serve)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Watch-folder ingestion for WhisperTrans.
+
+Audio files dropped into the watched directories are transcribed once they
+stop growing. Work is spread over a pool of worker processes that each load
+the model once. Finished files are recorded in a ledger so a restarted watcher
+does not transcribe them again.
+
+File system notifications (inotify on Linux, FSEvents on macOS) are used when
+the optional `watchdog` package is installed; otherwise directories are polled.
+"""
+
+import contextlib
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+import runtime_config
+from whisper_trans import load_whisper_model, save_transcription, transcribe_audio
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - optional dependency
+    Observer = None
+
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a", ".flac", ".ogg", ".opus", ".aac", ".mp4", ".webm"}
+LEDGER_NAME = ".whispertrans-watch.json"
+
+# Per-process state for pool workers
+_worker_model = None
+_worker_options: dict = {}
+
+
+def _init_worker(
+    model_size: str, options: dict, runtime: dict, counter, workers: int, tuning_lock
+) -> None:
+    """Pin the worker to its share of the CPUs and load the model once."""
+    global _worker_model, _worker_options
+    # Ctrl+C reaches the whole process group; leave it to the parent, which
+    # lets running transcriptions finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    with counter.get_lock():
+        worker_index = counter.value
+        counter.value += 1
+    runtime_config.apply_runtime_settings(runtime, worker_index % workers, workers)
+    autotune = runtime.get("autotune", False)
+    # One worker calibrates at a time, so the first measures on otherwise idle
+    # cores and persists its choice, and the others load that result
+    with tuning_lock if autotune else contextlib.nullcontext():
+        _worker_model = load_whisper_model(model_size, autotune, workers)
+    _worker_options = options
+
+
+def _transcribe_job(
+    audio_file: str, output_file: str, format: str, reflow: Optional[dict] = None
+) -> float:
+    """Transcribe one file in a worker and return the elapsed seconds."""
+    started = time.perf_counter()
+    result = transcribe_audio(_worker_model, audio_file, **_worker_options)
+    save_transcription(result, output_file, format, reflow)
+    return time.perf_counter() - started
+
+
+class FolderWatcher:
+    """
+    Transcribe audio files appearing in one or more directories.
+
+    Args:
+        directories: Directories to watch (not recursive)
+        model_size: Whisper model loaded by every worker
+        format: Output format
+        output_dir: Where to write outputs (default: next to each audio file)
+        workers: Number of worker processes
+        settle: Seconds a file's size and mtime must stay unchanged
+        poll_interval: Seconds between directory scans
+        runtime: Thread and affinity settings from runtime_config.runtime_settings()
+        reflow: Subtitle reflow limits for SRT/VTT output (None: no reflow)
+        transcribe_options: Extra keyword arguments for transcribe_audio
+    """
+
+    def __init__(
+        self,
+        directories: List[str],
+        model_size: str = "base",
+        format: str = "txt",
+        output_dir: Optional[str] = None,
+        workers: int = 1,
+        settle: float = 5.0,
+        poll_interval: float = 2.0,
+        runtime: Optional[dict] = None,
+        reflow: Optional[dict] = None,
+        transcribe_options: Optional[dict] = None,
+    ):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.model_size = model_size
+        self.format = format
+        self.output_dir = os.path.abspath(output_dir) if output_dir else None
+        self.workers = max(1, workers)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.runtime = runtime or runtime_config.runtime_settings()
+        self.reflow = reflow
+        self.transcribe_options = transcribe_options or {}
+
+        ledger_dir = self.output_dir or self.directories[0]
+        self.ledger_path = os.path.join(ledger_dir, LEDGER_NAME)
+        self._ledger: Dict[str, List] = self._load_ledger()
+        # Reentrant: done callbacks may fire on the thread holding the lock
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        # path -> (size, mtime_ns, time the signature was first seen)
+        self._candidates: Dict[str, Tuple[int, int, float]] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._failed: Dict[str, Tuple[int, int]] = {}
+        self.stats = {"completed": 0, "failed": 0, "busy_seconds": 0.0}
+        self._started = time.monotonic()
+
+    def _load_ledger(self) -> Dict[str, List]:
+        try:
+            with open(self.ledger_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_ledger(self) -> None:
+        os.makedirs(os.path.dirname(self.ledger_path), exist_ok=True)
+        temp_path = self.ledger_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self._ledger, f, indent=2)
+        os.replace(temp_path, self.ledger_path)
+
+    def output_path(self, audio_file: str) -> str:
+        base_name = os.path.splitext(os.path.basename(audio_file))[0]
+        directory = self.output_dir or os.path.dirname(audio_file)
+        return os.path.join(directory, f"{base_name}.{self.format}")
+
+    def _scan(self) -> List[Tuple[str, int, int]]:
+        """Return files whose size and mtime have been stable for the settle period."""
+        now = time.monotonic()
+        ready = []
+        seen = set()
+        for directory in self.directories:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as exc:
+                print(f"Cannot scan {directory}: {exc}")
+                continue
+            for entry in entries:
+                extension = os.path.splitext(entry.name)[1].lower()
+                if not entry.is_file() or extension not in AUDIO_EXTENSIONS:
+                    continue
+                path = entry.path
+                stat = entry.stat()
+                signature = (stat.st_size, stat.st_mtime_ns)
+                seen.add(path)
+                if (
+                    path in self._in_flight
+                    or self._ledger.get(path) == list(signature)
+                    or self._failed.get(path) == signature
+                ):
+                    continue
+                previous = self._candidates.get(path)
+                if previous is None or previous[:2] != signature:
+                    self._candidates[path] = (*signature, now)
+                elif now - previous[2] >= self.settle and stat.st_size > 0:
+                    ready.append((path, *signature))
+        # Forget files that disappeared before settling
+        for path in list(self._candidates):
+            if path not in seen:
+                del self._candidates[path]
+        return ready
+
+    def _on_done(self, path: str, signature: Tuple[int, int], future: Future) -> None:
+        with self._lock:
+            del self._in_flight[path]
+            self._candidates.pop(path, None)
+            if future.cancelled():
+                return
+            exc = future.exception()
+            if exc is None:
+                self.stats["completed"] += 1
+                self.stats["busy_seconds"] += future.result()
+                self._ledger[path] = list(signature)
+                self._save_ledger()
+                print(f"Transcribed {path} -> {self.output_path(path)}")
+            else:
+                self.stats["failed"] += 1
+                self._failed[path] = signature
+                print(f"Failed to transcribe {path}: {exc}")
+
+    def status(self) -> dict:
+        """Queue depth and throughput so far."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            return {
+                "queued": sum(1 for f in self._in_flight.values() if not f.running()),
+                "running": sum(1 for f in self._in_flight.values() if f.running()),
+                "waiting_to_settle": max(0, len(self._candidates) - len(self._in_flight)),
+                **self.stats,
+                "files_per_minute": self.stats["completed"] / elapsed * 60 if elapsed else 0.0,
+            }
+
+    def _start_observer(self):
+        if Observer is None:
+            print(f"Polling every {self.poll_interval:g}s (install 'watchdog' for notifications)")
+            return None
+
+        wakeup = self._wakeup
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wakeup.set()
+
+        observer = Observer()
+        for directory in self.directories:
+            observer.schedule(_Handler(), directory, recursive=False)
+        observer.start()
+        return observer
+
+    def _start_pool(self, counter) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(
+                self.model_size,
+                self.transcribe_options,
+                self.runtime,
+                counter,
+                self.workers,
+                multiprocessing.Lock(),
+            ),
+        )
+
+    def run(self, report_interval: float = 60.0) -> None:
+        """Watch until interrupted, then finish running jobs."""
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                raise FileNotFoundError(f"Watch directory not found: {directory}")
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+        print(f"Watching {', '.join(self.directories)} with {self.workers} worker(s)")
+        # Hands out worker indices for CPU affinity (replacement workers wrap
+        # around onto the same shares)
+        counter = multiprocessing.Value("i", 0)
+        executor = self._start_pool(counter)
+        observer = self._start_observer()
+        last_report = time.monotonic()
+        try:
+            while True:
+                with self._lock:
+                    ready = self._scan()
+                    for path, size, mtime_ns in ready:
+                        signature = (size, mtime_ns)
+                        try:
+                            future = executor.submit(
+                                _transcribe_job,
+                                path,
+                                self.output_path(path),
+                                self.format,
+                                self.reflow,
+                            )
+                        except BrokenProcessPool:
+                            # A worker died (crash, out of memory). Its callbacks
+                            # mark the files the pool took down as failed; this
+                            # one stays settled and goes to the new pool.
+                            print("A worker process died; starting a new worker pool")
+                            executor.shutdown(wait=False)
+                            executor = self._start_pool(counter)
+                            break
+                        self._in_flight[path] = future
+                        future.add_done_callback(
+                            lambda f, p=path, s=signature: self._on_done(p, s, f)
+                        )
+
+                if time.monotonic() - last_report >= report_interval:
+                    last_report = time.monotonic()
+                    print(format_watch_status(self.status()))
+
+                # Wake early on file system events, but keep polling so that
+                # settle timers expire even when nothing changes.
+                self._wakeup.wait(min(self.poll_interval, self.settle))
+                self._wakeup.clear()
+        except KeyboardInterrupt:
+            print("\nStopping watcher, waiting for running transcriptions...")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            executor.shutdown(wait=True, cancel_futures=True)
+            print(format_watch_status(self.status()))
+
+
+def format_watch_status(status: dict) -> str:
+    """Return a one-line summary of watcher progress."""
+    return (
+        f"[watch] queued={status['queued']} running={status['running']} "
+        f"settling={status['waiting_to_settle']} completed={status['completed']} "
+        f"failed={status['failed']} ({status['files_per_minute']:.2f} files/min)"
+    )
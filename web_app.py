@@ -5,16 +5,26 @@ from __future__ import annotations
 
 import multiprocessing
 import atexit
+import contextlib
+import gzip
+import hashlib
+import json
 import os
+import resource
 import shutil
+import sys
 import tempfile
+import threading
+import time
 import uuid
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from flask import (
     Flask,
     flash,
     get_flashed_messages,
+    jsonify,
     redirect,
     render_template,
     request,
@@ -22,12 +32,22 @@ from flask import (
 )
 from werkzeug.utils import secure_filename
 
+import runtime_config
+from admission import AdmissionController, AdmissionRejected, Ticket
+from profiling import JobProfiler
+from singleflight import SingleFlight
 from whisper_trans import (
+    DECODE_PROFILES,
+    DEFAULT_DECODE_PROFILE,
+    PROFILE_DIR,
     SUPPORTED_FORMATS,
     SUPPORTED_MODELS,
     build_transcription_output,
+    hash_file,
     load_whisper_model,
+    probe_duration,
     transcribe_audio,
+    with_draft_model,
 )
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
@@ -40,7 +60,41 @@ except ValueError:
     max_upload_mb_int = 200
 app.config["MAX_CONTENT_LENGTH"] = max_upload_mb_int * 1024 * 1024
 
-_model_cache: Dict[str, Any] = {}
+
+def _env_number(name: str, default: float) -> float:
+    """Read a numeric setting from the environment, falling back on bad values."""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Admission control: bound the projected compute backlog (in seconds) and the
+# number of concurrent transcriptions, and share workers fairly across clients
+_admission = AdmissionController(
+    max_backlog=_env_number("MAX_BACKLOG_SECONDS", 3600),
+    workers=int(_env_number("TRANSCRIBE_WORKERS", 1)),
+    max_client_jobs=int(_env_number("MAX_CLIENT_JOBS", 2)),
+)
+# Only honour X-Client-Id when a trusted proxy sets it; clients could otherwise
+# pick a fresh id per request and dodge the per-client limits
+_trust_client_id = os.environ.get("TRUST_CLIENT_ID_HEADER", "").lower() in ("1", "true", "yes")
+# Speaker diarization is skipped while more than this many jobs are waiting
+_diarize_max_queue = int(_env_number("DIARIZE_MAX_QUEUE", 0))
+# Identical uploads transcribed concurrently share a single run
+_inflight = SingleFlight()
+# Torch threads and CPU pinning from WHISPERTRANS_* variables; applied before
+# any model runs since inter-op threads can only be set once per process
+_runtime = runtime_config.runtime_settings()
+runtime_config.apply_runtime_settings(_runtime)
+
+# Whisper keeps the decoder's KV cache in forward hooks on the model's shared
+# attention modules, so an instance must only run one transcription at a time.
+# Idle instances are pooled per model size; since at most TRANSCRIBE_WORKERS
+# jobs run at once, no size ever has more instances than workers.
+_idle_models: Dict[str, List[Any]] = {}
+_models_lock = threading.Lock()
+_models_tuned = False
 # Server-side cache for transcription results
 _transcription_cache: Dict[str, str] = {}
 
@@ -49,18 +103,239 @@ _last_heartbeat: float = 0.0
 _shutdown_timeout: int = 60  # seconds of inactivity before shutdown
 
 
-def get_model(model_size: str):
-    """Load and cache Whisper models to avoid repeated downloads."""
+@contextlib.contextmanager
+def checkout_model(model_size: str):
+    """Borrow a model instance for one transcription, loading one if none is idle."""
+    global _models_tuned
     model_size = model_size if model_size in SUPPORTED_MODELS else "base"
-    if model_size not in _model_cache:
-        _model_cache[model_size] = load_whisper_model(model_size)
-    return _model_cache[model_size]
+    with _models_lock:
+        idle = _idle_models.setdefault(model_size, [])
+        model = idle.pop() if idle else None
+        # Thread counts are process-wide, so only the first model loaded is
+        # calibrated; concurrent transcriptions share the cores between them
+        autotune = _runtime["autotune"] and not _models_tuned
+        _models_tuned = True
+    if model is None:
+        model = load_whisper_model(model_size, autotune=autotune, workers=_admission.workers)
+    try:
+        yield model
+    finally:
+        with _models_lock:
+            _idle_models[model_size].append(model)
+
+
+def _client_id() -> str:
+    """Identify the caller for per-client fairness."""
+    client = request.headers.get("X-Client-Id") if _trust_client_id else None
+    return client or request.remote_addr or "anonymous"
+
+
+# Decoding options a request may set on top of its profile
+DECODE_OVERRIDES = ("beam_size", "best_of", "temperature", "condition_on_previous_text")
+# Upper bounds on those overrides, which multiply decode cost
+MAX_BEAM_SIZE = 10
+MAX_TEMPERATURES = 10
+
+
+def _parse_count(value: Optional[str], maximum: int) -> Optional[int]:
+    """Parse a beam size / candidate count; None when unset or invalid."""
+    try:
+        count = int(value or "")
+    except ValueError:
+        return None
+    return count if 1 <= count <= maximum else None
+
+
+def _parse_temperatures(value: Optional[str]) -> Optional[Tuple[float, ...]]:
+    """Parse a comma-separated temperature schedule; None when unset or invalid."""
+    try:
+        temperatures = tuple(float(t) for t in (value or "").split(","))
+    except ValueError:
+        return None
+    if len(temperatures) > MAX_TEMPERATURES or not all(0 <= t <= 1 for t in temperatures):
+        return None
+    return temperatures
+
+
+def _parse_options(values) -> Dict[str, Any]:
+    """Validate transcription options from form fields or query parameters."""
+    model = values.get("model", "base")
+    if model not in SUPPORTED_MODELS:
+        model = "base"
+
+    format = values.get("format", "txt")
+    if format not in SUPPORTED_FORMATS:
+        format = "txt"
+
+    # Speculative decoding only helps when the draft is smaller
+    draft_model = values.get("draft_model", "")
+    if draft_model not in SUPPORTED_MODELS or SUPPORTED_MODELS.index(
+        draft_model
+    ) >= SUPPORTED_MODELS.index(model):
+        draft_model = ""
+
+    profile = values.get("profile", DEFAULT_DECODE_PROFILE)
+    if profile not in DECODE_PROFILES:
+        profile = DEFAULT_DECODE_PROFILE
+
+    # Unset overrides keep the profile's value
+    condition = values.get("condition_on_previous_text", "").lower()
+    if condition in ("on", "true", "1", "yes"):
+        condition_on_previous_text: Optional[bool] = True
+    elif condition in ("off", "false", "0", "no"):
+        condition_on_previous_text = False
+    else:
+        condition_on_previous_text = None
+
+    return {
+        "model": model,
+        "format": format,
+        "language": values.get("language", "").strip(),
+        "draft_model": draft_model,
+        "profile": profile,
+        "beam_size": _parse_count(values.get("beam_size"), MAX_BEAM_SIZE),
+        "best_of": _parse_count(values.get("best_of"), MAX_BEAM_SIZE),
+        "temperature": _parse_temperatures(values.get("temperature")),
+        "condition_on_previous_text": condition_on_previous_text,
+        "diarize": values.get("diarize", "").lower() in ("on", "true", "1", "yes"),
+        "reflow": values.get("reflow", "").lower() in ("on", "true", "1", "yes"),
+        "profiling": values.get("profiling", "").lower() in ("on", "true", "1", "yes"),
+    }
+
+
+class _RunProgress:
+    """Admission outcome and start of a run, shared with the jobs joining it."""
+
+    def __init__(self):
+        self._decided = threading.Event()
+        self._admitted = False
+        self._started = False
+        self._on_start: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def decide(self, admitted: bool) -> None:
+        self._admitted = admitted
+        self._decided.set()
+
+    def wait_admitted(self) -> bool:
+        """Wait for the admission decision; False if the run never got queued."""
+        self._decided.wait()
+        return self._admitted
+
+    def start(self) -> None:
+        with self._lock:
+            self._started = True
+            callbacks, self._on_start = self._on_start, []
+        for callback in callbacks:
+            callback()
+
+    def when_started(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if not self._started:
+                self._on_start.append(callback)
+                return
+        callback()
+
+
+def _transcribe_upload(
+    file_path: str,
+    options: Dict[str, Any],
+    client: str,
+    on_admitted: Optional[Callable[[], None]] = None,
+    on_started: Optional[Callable[[], None]] = None,
+) -> dict:
+    """
+    Transcribe a saved upload under admission control and single-flight.
+
+    Args:
+        on_admitted: Called once the job is queued (or joins an identical run)
+        on_started: Called once the job's run gets a worker slot
+
+    Raises:
+        AdmissionRejected: if the job does not fit in the backlog
+    """
+
+    progress = _RunProgress()
+    if on_started is not None:
+        progress.when_started(on_started)
+
+    def run_transcription():
+        try:
+            ticket = _admission.admit(client, options["model"], probe_duration(file_path))
+        except BaseException:
+            # Joined jobs get the same exception, e.g. the rejection
+            progress.decide(False)
+            raise
+        progress.decide(True)
+        if on_admitted is not None:
+            on_admitted()
+        with _admission.slot(ticket), contextlib.ExitStack() as models:
+            progress.start()
+            return run_admitted(ticket, models)
+
+    def run_admitted(ticket: Ticket, models: contextlib.ExitStack) -> dict:
+        model = models.enter_context(checkout_model(options["model"]))
+        if options["draft_model"]:
+            draft = models.enter_context(checkout_model(options["draft_model"]))
+            model = with_draft_model(
+                model, options["model"], options["draft_model"], lambda _: draft
+            )
+        # Keep model loading out of the measured speed used to price jobs
+        ticket.restart_clock()
+        # Shed the optional diarization stage under load
+        under_load = _admission.snapshot()["queued"] > _diarize_max_queue
+        profiler = None
+        if options["profiling"]:
+            profiler = JobProfiler(PROFILE_DIR, f"{key[0][:16]}-{int(time.time())}")
+        with profiler or contextlib.nullcontext():
+            result = transcribe_audio(
+                model,
+                file_path,
+                language=options["language"] or None,
+                decode_profile=options["profile"],
+                decode_overrides=decode_overrides,
+                diarize=options["diarize"] and not under_load,
+                word_timestamps=options["reflow"],
+                profiler=profiler,
+            )
+        if profiler is not None and profiler.summary is not None:
+            result["profile"] = profiler.summary
+        return result
+
+    decode_overrides = {name: options[name] for name in DECODE_OVERRIDES}
+    # The draft model is left out of the key: speculative decoding
+    # reproduces the plain greedy output.
+    key = (
+        hash_file(file_path),
+        options["model"],
+        options["language"],
+        options["profile"],
+        *decode_overrides.values(),
+        options["diarize"],
+        options["reflow"],
+        options["profiling"],
+    )
+
+    def on_join(run: _RunProgress):
+        # Report nothing until the run is queued; if it is rejected, the
+        # rejection is raised here as well
+        if not run.wait_admitted():
+            return
+        if on_admitted is not None:
+            on_admitted()
+        if on_started is not None:
+            run.when_started(on_started)
+
+    result, _ = _inflight.do(key, run_transcription, on_join=on_join, context=progress)
+    return result
 
 
 @app.route("/", methods=["GET", "POST"])
 def index():
     transcription_text = None
     error = None
+    status = 200
+    headers: Dict[str, str] = {}
 
     # Retrieve flashed transcription ID from previous POST
     for message in get_flashed_messages(with_categories=True):
@@ -70,19 +345,7 @@ def index():
             transcription_text = _transcription_cache.get(message_text)
         elif category == "error":
             error = message_text
-    if request.method == "POST":
-        selected_model = request.form.get("model", "base")
-        if selected_model not in SUPPORTED_MODELS:
-            selected_model = "base"
-
-        selected_format = request.form.get("format", "txt")
-        if selected_format not in SUPPORTED_FORMATS:
-            selected_format = "txt"
-        language = request.form.get("language", "")
-    else:
-        selected_model = "base"
-        selected_format = "txt"
-        language = ""
+    options = _parse_options(request.form if request.method == "POST" else {})
 
     if request.method == "POST":
         upload = request.files.get("audio_file")
@@ -100,16 +363,19 @@ def index():
         upload.save(file_path)
 
         try:
-            model = get_model(selected_model)
-            result = transcribe_audio(
-                model, file_path, language=language.strip() or None
+            result = _transcribe_upload(file_path, options, _client_id())
+            transcription_text = build_transcription_output(
+                result, options["format"], {} if options["reflow"] else None
             )
-            transcription_text = build_transcription_output(result, selected_format)
             # Generate a small ID and store the transcription server-side instead of in session
             transcription_id = str(uuid.uuid4())
             _transcription_cache[transcription_id] = transcription_text
             flash(transcription_id, "transcription")
             return redirect(url_for("index"))
+        except AdmissionRejected as exc:
+            error = str(exc)
+            status = 429
+            headers["Retry-After"] = str(exc.retry_after)
         except Exception as exc:  # pragma: no cover - surfacing to UI
             error = str(exc)
         finally:
@@ -119,11 +385,342 @@ def index():
         "index.html",
         transcription=transcription_text,
         error=error,
-        selected_model=selected_model,
-        selected_format=selected_format,
-        language=language,
+        selected_model=options["model"],
+        selected_format=options["format"],
+        selected_draft=options["draft_model"],
+        selected_profile=options["profile"],
+        beam_size=options["beam_size"],
+        best_of=options["best_of"],
+        temperature=options["temperature"],
+        condition_on_previous_text=options["condition_on_previous_text"],
+        diarize=options["diarize"],
+        reflow=options["reflow"],
+        language=options["language"],
         supported_models=SUPPORTED_MODELS,
         supported_formats=SUPPORTED_FORMATS,
+        decode_profiles=list(DECODE_PROFILES),
+    ), status, headers
+
+
+# ---------------------------------------------------------------------------
+# JSON API for programmatic clients
+# ---------------------------------------------------------------------------
+
+MAX_API_JOBS = 1000
+GZIP_MIN_BYTES = 1024
+
+
+class ApiJob:
+    """A transcription submitted through the JSON API."""
+
+    def __init__(self, filename: str, options: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.options = options
+        self.status = "pending"
+        self.created = time.time()
+        self.completed: Optional[float] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.retry_after: Optional[int] = None
+        self.admitted = threading.Event()
+        self.finished = threading.Event()
+
+    def to_dict(self) -> dict:
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "options": self.options,
+            "created": self.created,
+            "completed": self.completed,
+            "url": url_for("api_get_transcription", job_id=self.id),
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        if self.retry_after is not None:
+            data["retry_after"] = self.retry_after
+        return data
+
+
+_api_jobs: "OrderedDict[str, ApiJob]" = OrderedDict()
+_api_batches: "OrderedDict[str, List[str]]" = OrderedDict()
+_api_lock = threading.Lock()
+
+
+def _register_job(job: ApiJob) -> None:
+    with _api_lock:
+        _api_jobs[job.id] = job
+        # Evict the oldest finished jobs beyond the retention limit
+        for job_id in list(_api_jobs):
+            if len(_api_jobs) <= MAX_API_JOBS:
+                break
+            if _api_jobs[job_id].status in ("completed", "failed", "rejected"):
+                del _api_jobs[job_id]
+        while len(_api_batches) > MAX_API_JOBS:
+            _api_batches.popitem(last=False)
+
+
+def _run_api_job(job: ApiJob, file_path: str, temp_dir: str, client: str, retry: bool) -> None:
+    """Transcribe one API job; with retry, wait out admission rejections."""
+
+    def mark_admitted():
+        job.status = "queued"
+        job.admitted.set()
+
+    def mark_started():
+        if job.status == "queued":
+            job.status = "processing"
+
+    try:
+        while True:
+            try:
+                result = _transcribe_upload(
+                    file_path, job.options, client, mark_admitted, mark_started
+                )
+                break
+            except AdmissionRejected as exc:
+                if not retry:
+                    job.status = "rejected"
+                    job.error = str(exc)
+                    job.retry_after = exc.retry_after
+                    return
+                time.sleep(exc.retry_after)
+        job.result = {
+            "text": result["text"].strip(),
+            "language": result.get("language"),
+            "output": build_transcription_output(
+                result, job.options["format"], {} if job.options["reflow"] else None
+            ),
+            "segments": [
+                {
+                    k: segment[k]
+                    for k in ("id", "start", "end", "text", "speaker", "hallucination")
+                    if k in segment
+                }
+                for segment in result["segments"]
+            ],
+            "timing": result.get("timing"),
+        }
+        if "profile" in result:
+            job.result["profile"] = result["profile"]
+        job.status = "completed"
+    except Exception as exc:  # pragma: no cover - reported to the client
+        job.status = "failed"
+        job.error = str(exc)
+    finally:
+        job.completed = time.time()
+        job.admitted.set()
+        job.finished.set()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _api_response(
+    body: bytes,
+    mimetype: str = "application/json",
+    status: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+):
+    """Build a response with an ETag, 304 on conditional GETs and gzip when accepted."""
+    etag = hashlib.sha1(body).hexdigest()
+    if request.method == "GET" and request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    response = app.response_class(body, status=status, mimetype=mimetype, headers=headers)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    if len(body) >= GZIP_MIN_BYTES and request.accept_encodings["gzip"]:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def _api_json(payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return _api_response(body, status=status, headers=headers)
+
+
+def _api_error(message: str, status: int, headers: Optional[Dict[str, str]] = None):
+    return _api_json({"error": message}, status, headers)
+
+
+def _save_api_upload(upload=None) -> Tuple[str, str, str]:
+    """
+    Save a multipart upload, or the raw request body, to a temporary file.
+
+    Returns:
+        (filename, file path, temporary directory)
+    """
+    if upload is not None:
+        filename = secure_filename(upload.filename or "") or "upload"
+    else:
+        filename = secure_filename(request.args.get("filename", "")) or "upload"
+    temp_dir = tempfile.mkdtemp(prefix="whisper_trans_")
+    file_path = os.path.join(temp_dir, filename)
+    if upload is not None:
+        upload.save(file_path)
+    else:
+        with open(file_path, "wb") as f:
+            shutil.copyfileobj(request.stream, f)
+    return filename, file_path, temp_dir
+
+
+@app.route("/api/models", methods=["GET"])
+def api_models():
+    """List the models, formats and decode profiles the API accepts."""
+    return _api_json(
+        {
+            "models": SUPPORTED_MODELS,
+            "formats": SUPPORTED_FORMATS,
+            "profiles": list(DECODE_PROFILES),
+        }
+    )
+
+
+@app.route("/api/transcriptions", methods=["POST"])
+def api_create_transcription():
+    """
+    Submit one audio file as multipart field "audio_file" or as the raw body.
+
+    Options (model, format, language, profile, draft_model, diarize, reflow,
+    profiling) are read from form fields or the query string; with a raw body,
+    from the query string only. Returns 202 with the job, or the finished job
+    when ?wait=true (500 if it failed).
+    """
+    if request.mimetype.startswith("multipart/"):
+        upload = request.files.get("audio_file") or request.files.get("file")
+        if upload is None:
+            return _api_error("No audio provided.", 400)
+        values = request.values
+    else:
+        # The body is the audio whatever its declared type (curl --data-binary
+        # sends form-urlencoded), so never let the form parser consume it
+        if not request.content_length:
+            return _api_error("No audio provided.", 400)
+        upload = None
+        values = request.args
+
+    options = _parse_options(values)
+    filename, file_path, temp_dir = _save_api_upload(upload)
+    job = ApiJob(filename, options)
+    threading.Thread(
+        target=_run_api_job,
+        args=(job, file_path, temp_dir, _client_id(), False),
+        daemon=True,
+    ).start()
+
+    # Admission decisions are immediate; only queueing for a worker blocks
+    job.admitted.wait()
+    if job.status == "rejected":
+        return _api_json(job.to_dict(), 429, {"Retry-After": str(job.retry_after)})
+
+    _register_job(job)
+    if request.args.get("wait", "").lower() in ("1", "true", "yes"):
+        job.finished.wait()
+        return _api_json(job.to_dict(), 200 if job.status == "completed" else 500)
+    return _api_json(job.to_dict(), 202, {"Location": job.to_dict()["url"]})
+
+
+@app.route("/api/transcriptions/<job_id>", methods=["GET"])
+def api_get_transcription(job_id: str):
+    """Poll a job; supports If-None-Match and gzip."""
+    job = _api_jobs.get(job_id)
+    if job is None:
+        return _api_error("Unknown transcription id.", 404)
+    return _api_json(job.to_dict())
+
+
+@app.route("/api/transcriptions/<job_id>/output", methods=["GET"])
+def api_get_output(job_id: str):
+    """Download the formatted transcription (txt, srt, vtt or json)."""
+    job = _api_jobs.get(job_id)
+    if job is None:
+        return _api_error("Unknown transcription id.", 404)
+    if job.status != "completed":
+        return _api_error(f"Transcription is {job.status}.", 409)
+    mimetypes = {"srt": "application/x-subrip", "vtt": "text/vtt", "json": "application/json"}
+    return _api_response(
+        job.result["output"].encode("utf-8"),
+        mimetype=mimetypes.get(job.options["format"], "text/plain"),
+    )
+
+
+@app.route("/api/batch", methods=["POST"])
+def api_create_batch():
+    """
+    Submit many files (multipart fields "files") with shared options.
+
+    Files are transcribed one after another, so a batch holds a single
+    admission slot and waits out backpressure instead of being rejected.
+    """
+    uploads = request.files.getlist("files") or list(request.files.values())
+    if not uploads:
+        return _api_error("No audio files provided.", 400)
+
+    options = _parse_options(request.values)
+    client = _client_id()
+    batch_id = uuid.uuid4().hex
+    pending = []
+    for upload in uploads:
+        filename, file_path, temp_dir = _save_api_upload(upload)
+        job = ApiJob(filename, options)
+        _register_job(job)
+        pending.append((job, file_path, temp_dir))
+
+    def run_batch():
+        for job, file_path, temp_dir in pending:
+            _run_api_job(job, file_path, temp_dir, client, True)
+
+    threading.Thread(target=run_batch, daemon=True).start()
+    with _api_lock:
+        _api_batches[batch_id] = [job.id for job, _, _ in pending]
+    url = url_for("api_get_batch", batch_id=batch_id)
+    return _api_json(
+        {"id": batch_id, "url": url, "jobs": [job.to_dict() for job, _, _ in pending]},
+        202,
+        {"Location": url},
+    )
+
+
+@app.route("/api/batch/<batch_id>", methods=["GET"])
+def api_get_batch(batch_id: str):
+    """Poll every job of a batch; supports If-None-Match and gzip."""
+    job_ids = _api_batches.get(batch_id)
+    if job_ids is None:
+        return _api_error("Unknown batch id.", 404)
+    jobs = [_api_jobs[job_id].to_dict() for job_id in job_ids if job_id in _api_jobs]
+    done = all(job["status"] in ("completed", "failed", "rejected") for job in jobs)
+    return _api_json({"id": batch_id, "done": done, "jobs": jobs})
+
+
+def _process_memory() -> Dict[str, Optional[int]]:
+    """Current (Linux only) and peak resident memory of this process in bytes."""
+    rss = None
+    try:
+        with open("/proc/self/statm", "r") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return {"rss_bytes": rss, "peak_rss_bytes": peak if sys.platform == "darwin" else peak * 1024}
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Expose queue depth, backlog, coalescing counters, torch threading and memory as JSON."""
+    return jsonify(
+        {
+            "admission": _admission.snapshot(),
+            "singleflight": _inflight.snapshot(),
+            "runtime": runtime_config.current_runtime(),
+            "memory": _process_memory(),
+        }
     )
 
 
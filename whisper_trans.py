@@ -7,38 +7,234 @@ It supports various audio formats and provides multiple output options.
 """
 
 import argparse
+import contextlib
+import hashlib
+import json
+import math
 import os
+import subprocess
 import sys
-from typing import Optional
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Union
 
+import numpy as np
 import whisper
 
+import model_store
+import runtime_config
+from audio_preprocessing import load_audio, wav_layout
+from diarization import assign_speakers, diarize_file
+from loop_guard import GuardedWhisper, format_guard_report, guard_report
+from profiling import JobProfiler, format_profile_summary
+from speculative_decoding import SpeculativeWhisper, acceptance_rate
+from subtitle_reflow import reflow as reflow_subtitles
+
 SUPPORTED_MODELS = ["tiny", "base", "small", "medium", "large"]
-SUPPORTED_FORMATS = ["txt", "srt", "vtt"]
+SUPPORTED_FORMATS = ["txt", "srt", "vtt", "json"]
+
+# Per-audio caches (diarization turns, ...) keyed by content hash
+CACHE_DIR = os.environ.get(
+    "WHISPERTRANS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "whispertrans")
+)
+# Where --profile and the API's profiling option write profiles
+PROFILE_DIR = os.environ.get("WHISPERTRANS_PROFILE_DIR", os.path.join(CACHE_DIR, "profiles"))
+
+# Segment confidence thresholds for cascade mode. These mirror the defaults
+# Whisper itself uses to decide on temperature fallback.
+CASCADE_THRESHOLDS = {
+    "logprob_threshold": -1.0,
+    "compression_ratio_threshold": 2.4,
+    "no_speech_threshold": 0.6,
+}
+SAMPLE_RATE = 16000
+# Whisper pads every window of audio it encodes to this many seconds
+WINDOW_SECONDS = 30
+
+# Whisper's default temperature schedule: retry at increasing temperatures when
+# a window fails the compression ratio / log probability checks.
+FALLBACK_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+# Named decoding presets passed through to model.transcribe(). "balanced" is
+# Whisper's own default behaviour.
+DECODE_PROFILES = {
+    "fast": {
+        "beam_size": None,
+        "best_of": None,
+        "temperature": (0.0,),
+        "condition_on_previous_text": False,
+    },
+    "balanced": {
+        "beam_size": None,
+        "best_of": None,
+        "temperature": FALLBACK_TEMPERATURES,
+        "condition_on_previous_text": True,
+    },
+    "accurate": {
+        "beam_size": 5,
+        "best_of": 5,
+        "temperature": FALLBACK_TEMPERATURES,
+        "condition_on_previous_text": True,
+    },
+}
+DEFAULT_DECODE_PROFILE = "balanced"
 
 
-def load_whisper_model(model_size: str = "base") -> whisper.Whisper:
+def load_whisper_model(
+    model_size: str = "base", autotune: bool = False, workers: int = 1
+) -> whisper.Whisper:
     """
     Load the Whisper model.
     
     Args:
         model_size: Size of the model to load. Options are:
                     'tiny', 'base', 'small', 'medium', 'large'
+        autotune: Calibrate (or reuse the persisted) torch thread count for
+                  this model on this host
+        workers: Processes or threads sharing the host's CPUs, for autotune
     
     Returns:
         Loaded Whisper model
     """
     print(f"Loading Whisper {model_size} model...")
-    model = whisper.load_model(model_size)
+    # Memory-mapped from the model store when staged, downloaded otherwise
+    model = model_store.load_model(model_size)
     print("Model loaded successfully!")
+    if autotune and model.device.type == "cpu":
+        runtime_config.autotune(
+            model, model_size, os.path.join(CACHE_DIR, "runtime.json"), workers
+        )
     return model
 
 
+def with_draft_model(
+    model: whisper.Whisper, model_size: str, draft_size: Optional[str], loader=None
+) -> whisper.Whisper:
+    """
+    Wrap a model for speculative decoding with a smaller draft model.
+
+    Args:
+        model: Loaded Whisper model
+        model_size: Size name of the loaded model
+        draft_size: Size name of the draft model, or None to disable
+        loader: Callable loading a model by size (default: load_whisper_model)
+
+    Returns:
+        The model itself, or a SpeculativeWhisper wrapper
+    """
+    if not draft_size:
+        return model
+    if SUPPORTED_MODELS.index(draft_size) >= SUPPORTED_MODELS.index(model_size):
+        raise ValueError(
+            f"Draft model '{draft_size}' must be smaller than '{model_size}'"
+        )
+    draft = (loader or load_whisper_model)(draft_size)
+    return SpeculativeWhisper(model, draft)
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def probe_duration(audio_file: str) -> float:
+    """
+    Get the duration of an audio file without decoding it.
+
+    Uses ffprobe when available, the WAV header for WAV files, and otherwise
+    estimates from the file size assuming 128 kbps compressed audio.
+
+    Args:
+        audio_file: Path to the audio file
+
+    Returns:
+        Duration in seconds
+    """
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", audio_file],
+            capture_output=True, check=True, text=True, timeout=10,
+        ).stdout
+        return float(output.strip())
+    except (OSError, subprocess.SubprocessError, ValueError):
+        pass
+
+    try:
+        with wave.open(audio_file, "rb") as f:
+            return f.getnframes() / f.getframerate()
+    except (wave.Error, EOFError, OSError):
+        pass
+
+    return os.path.getsize(audio_file) / (128_000 / 8)
+
+
+def resolve_decode_options(
+    profile: str = DEFAULT_DECODE_PROFILE, overrides: Optional[dict] = None
+) -> dict:
+    """
+    Build transcribe() keyword arguments from a named profile plus overrides.
+
+    Args:
+        profile: Name of a preset in DECODE_PROFILES
+        overrides: Options replacing the preset's values; None values are ignored
+
+    Returns:
+        Decoding options, with unset beam_size/best_of removed
+    """
+    if profile not in DECODE_PROFILES:
+        raise ValueError(f"Unsupported decode profile: {profile}")
+    options = dict(DECODE_PROFILES[profile])
+    options.update({k: v for k, v in (overrides or {}).items() if v is not None})
+    options["temperature"] = tuple(options["temperature"])
+    # transcribe() drops beam_size when sampling and best_of when greedy, so
+    # both can be set; unset ones are left out to keep reports readable.
+    return {k: v for k, v in options.items() if v is not None}
+
+
+def summarize_fallbacks(segments: List[dict], temperatures: Tuple[float, ...]) -> dict:
+    """
+    Count temperature fallback retries from the temperatures recorded per segment.
+
+    Every 30-second window is decoded once per temperature tried, and all
+    segments of a window share its seek offset and final temperature.
+
+    Args:
+        segments: Whisper segment dictionaries
+        temperatures: Temperature schedule used for decoding
+
+    Returns:
+        Window count, windows that needed a retry, and total retries
+    """
+    window_temperatures = {s["seek"]: s["temperature"] for s in segments}
+    retries = [
+        min(range(len(temperatures)), key=lambda i: abs(temperatures[i] - t))
+        for t in window_temperatures.values()
+    ]
+    return {
+        "windows": len(retries),
+        "fallback_windows": sum(1 for r in retries if r),
+        "fallback_retries": sum(retries),
+    }
+
+
 def transcribe_audio(
     model: whisper.Whisper, 
     audio_file: str, 
     language: Optional[str] = None,
-    verbose: bool = False
+    verbose: bool = False,
+    decode_profile: str = DEFAULT_DECODE_PROFILE,
+    decode_overrides: Optional[dict] = None,
+    diarize: bool = False,
+    num_speakers: Optional[int] = None,
+    loop_guard: bool = True,
+    word_timestamps: bool = False,
+    profiler: Optional[JobProfiler] = None,
 ) -> dict:
     """
     Transcribe an audio file using Whisper model.
@@ -48,9 +244,18 @@ def transcribe_audio(
         audio_file: Path to the audio file
         language: Language of the audio (optional)
         verbose: Whether to print verbose output
+        decode_profile: Name of a preset in DECODE_PROFILES
+        decode_overrides: Custom decoding options replacing the preset's values
+        diarize: Label segments by speaker; runs alongside transcription
+        num_speakers: Known number of speakers for diarization (optional)
+        loop_guard: Cut repetition loops short and flag looping segments
+        word_timestamps: Time every word (slower), e.g. for subtitle reflow
+        profiler: Active JobProfiler around this call, to time fallback retries
     
     Returns:
-        Transcription result as a dictionary
+        Transcription result as a dictionary, with "decode" and "timing"
+        reports, a "guard" report when loop_guard is set and, when diarizing,
+        a "diarization" report
     """
     if not os.path.exists(audio_file):
         raise FileNotFoundError(f"Audio file not found: {audio_file}")
@@ -58,50 +263,411 @@ def transcribe_audio(
     print(f"Transcribing audio file: {audio_file}")
     
     # Options for transcription
+    decode_options = resolve_decode_options(decode_profile, decode_overrides)
     options = {
         "verbose": verbose,
+        **decode_options,
     }
     
     if language:
         options["language"] = language
+    if word_timestamps:
+        options["word_timestamps"] = True
     
+    # Decode once: 16 kHz mono WAV is read directly, anything else goes through
+    # ffmpeg and is cached by content hash (which also keys diarization)
+    needs_key = diarize or wav_layout(audio_file) is None
+    cache_key = hash_file(audio_file) if needs_key else None
+    audio, audio_report = load_audio(audio_file, cache_key, CACHE_DIR)
+
+    # Diarization only needs the CPU for a fraction of the decode time, so it
+    # runs in a background thread while Whisper transcribes.
+    diarization = None
+    if diarize:
+        executor = ThreadPoolExecutor(max_workers=1)
+        diarization = executor.submit(
+            lambda: diarize_file(audio_file, cache_key, num_speakers, CACHE_DIR, audio=audio)
+        )
+        executor.shutdown(wait=False)
+
     # Transcribe the audio
-    result = model.transcribe(audio_file, **options)
+    started = time.perf_counter()
+    guarded = GuardedWhisper(model) if loop_guard else None
+    runner = guarded or model
+    if profiler is not None:
+        runner = profiler.wrap(runner)
+    result = runner.transcribe(audio, **options)
+    if guarded is not None:
+        guard_report(result, guarded)
+    result["timing"] = {
+        "audio_source": audio_report["source"],
+        "decode_seconds": audio_report["decode_seconds"],
+        "inference_seconds": time.perf_counter() - started,
+        "audio_seconds": len(audio) / SAMPLE_RATE,
+    }
+    result["decode"] = {
+        "profile": decode_profile,
+        "options": decode_options,
+        **summarize_fallbacks(result["segments"], decode_options["temperature"]),
+    }
+
+    if diarization is not None:
+        report = diarization.result()
+        assign_speakers(result["segments"], report["turns"])
+        result["diarization"] = {k: v for k, v in report.items() if k != "turns"}
     
     return result
 
 
-def build_transcription_output(result: dict, format: str = "txt") -> str:
-    """Return the transcription as a formatted string."""
+def format_timing_report(report: dict) -> str:
+    """Return a one-line summary of audio decoding versus inference time."""
+    rtf = report["inference_seconds"] / report["audio_seconds"] if report["audio_seconds"] else 0.0
+    return (
+        f"Audio decode {report['decode_seconds']:.2f}s ({report['audio_source']}), "
+        f"inference {report['inference_seconds']:.1f}s for "
+        f"{report['audio_seconds']:.1f}s of audio (RTF {rtf:.2f})"
+    )
+
+
+def format_decode_report(report: dict) -> str:
+    """Return a one-line summary of decoding options and fallback retries."""
+    options = ", ".join(f"{k}={v}" for k, v in report["options"].items())
+    return (
+        f"Profile '{report['profile']}' ({options}): "
+        f"{report['fallback_retries']} temperature fallback retries in "
+        f"{report['fallback_windows']}/{report['windows']} windows"
+    )
+
+
+def needs_escalation(segment: dict, thresholds: Optional[dict] = None) -> bool:
+    """
+    Decide whether a segment is too low-confidence to keep.
+
+    Args:
+        segment: Whisper segment dictionary
+        thresholds: Overrides for CASCADE_THRESHOLDS
+
+    Returns:
+        True if the segment should be re-transcribed with a larger model
+    """
+    limits = {**CASCADE_THRESHOLDS, **(thresholds or {})}
+    return (
+        segment.get("avg_logprob", 0.0) < limits["logprob_threshold"]
+        or segment.get("compression_ratio", 0.0) > limits["compression_ratio_threshold"]
+        or segment.get("no_speech_prob", 0.0) > limits["no_speech_threshold"]
+    )
+
+
+@contextlib.contextmanager
+def _time_module(module, timing: dict):
+    """Add the time spent in module's forward passes to timing["seconds"]."""
+
+    def before(module, inputs):
+        timing["started"] = time.perf_counter()
+
+    def after(module, inputs, output):
+        timing["seconds"] += time.perf_counter() - timing["started"]
+
+    hooks = [module.register_forward_pre_hook(before), module.register_forward_hook(after)]
+    try:
+        yield timing
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+
+def _escalation_spans(
+    segments: List[dict], flagged: List[bool], max_gap: float = 1.0
+) -> List[Tuple[int, int]]:
+    """Group flagged segments into (first, last) index spans, merging close neighbours."""
+    spans: List[Tuple[int, int]] = []
+    for i, is_flagged in enumerate(flagged):
+        if not is_flagged:
+            continue
+        if spans and segments[i]["start"] - segments[spans[-1][1]]["end"] <= max_gap:
+            spans[-1] = (spans[-1][0], i)
+        else:
+            spans.append((i, i))
+    return spans
+
+
+def transcribe_cascade(
+    model: whisper.Whisper,
+    audio_file: str,
+    escalation_model: Union[str, whisper.Whisper] = "large",
+    language: Optional[str] = None,
+    verbose: bool = False,
+    thresholds: Optional[dict] = None,
+    padding: float = 0.25,
+    decode_profile: str = DEFAULT_DECODE_PROFILE,
+    decode_overrides: Optional[dict] = None,
+    loop_guard: bool = True,
+    profiler: Optional[JobProfiler] = None,
+) -> dict:
+    """
+    Transcribe with a fast model, re-transcribing low-confidence segments with a larger one.
+
+    The audio is decoded once and shared between both passes. Segments that fail
+    the confidence checks in needs_escalation() are grouped into spans, the
+    corresponding audio is re-transcribed by the escalation model and the
+    improved segments are spliced back into the fast result.
+
+    Args:
+        model: Loaded fast Whisper model
+        audio_file: Path to the audio file
+        escalation_model: Loaded model or model size name; names are only
+                          loaded if at least one segment needs escalation
+        language: Language of the audio (optional)
+        verbose: Whether to print verbose output
+        thresholds: Overrides for CASCADE_THRESHOLDS
+        padding: Seconds of context added around each escalated span
+        decode_profile: Name of a preset in DECODE_PROFILES, used by both passes
+        decode_overrides: Custom decoding options replacing the preset's values
+        loop_guard: Cut repetition loops short and flag looping segments, in both passes
+        profiler: Active JobProfiler timing the decode calls of both passes
+
+    Returns:
+        Transcription result as a dictionary, with "cascade", "decode" and
+        "timing" reports, and a "guard" report when loop_guard is set
+    """
+    if not os.path.exists(audio_file):
+        raise FileNotFoundError(f"Audio file not found: {audio_file}")
+
+    print(f"Transcribing audio file: {audio_file} (cascade mode)")
+    cache_key = hash_file(audio_file) if wav_layout(audio_file) is None else None
+    audio, audio_report = load_audio(audio_file, cache_key, CACHE_DIR)
+    audio_seconds = len(audio) / SAMPLE_RATE
+
+    decode_options = resolve_decode_options(decode_profile, decode_overrides)
+    temperatures = decode_options["temperature"]
+    options = {"verbose": verbose, **decode_options}
+    if language:
+        options["language"] = language
+
+    guards: List[GuardedWhisper] = []
+
+    def run_pass(pass_model: whisper.Whisper, clip: np.ndarray) -> dict:
+        runner = pass_model
+        if loop_guard:
+            runner = GuardedWhisper(pass_model)
+            guards.append(runner)
+        if profiler is not None:
+            runner = profiler.wrap(runner)
+        return runner.transcribe(clip, **options)
+
+    started = time.perf_counter()
+    result = run_pass(model, audio)
+    fast_seconds = time.perf_counter() - started
+    fallbacks = summarize_fallbacks(result["segments"], temperatures)
+
+    segments = result["segments"]
+    flagged = [needs_escalation(segment, thresholds) for segment in segments]
+    spans = _escalation_spans(segments, flagged)
+
+    load_seconds = 0.0
+    escalation_seconds = 0.0
+    escalated_seconds = 0.0
+    escalation_windows = 0
+    escalated_tokens = 0
+    encoder_time = {"seconds": 0.0}
+    if spans:
+        if isinstance(escalation_model, str):
+            started = time.perf_counter()
+            escalation_model = load_whisper_model(escalation_model)
+            load_seconds = time.perf_counter() - started
+        options["language"] = language or result.get("language")
+        with _time_module(escalation_model.encoder, encoder_time):
+            merged: List[dict] = []
+            cursor = 0
+            for first, last in spans:
+                merged.extend(segments[cursor:first])
+                lower = segments[first - 1]["end"] if first > 0 else 0.0
+                upper = (
+                    segments[last + 1]["start"] if last + 1 < len(segments) else audio_seconds
+                )
+                start = max(lower, segments[first]["start"] - padding)
+                end = min(upper, segments[last]["end"] + padding)
+                clip = audio[int(start * SAMPLE_RATE) : int(end * SAMPLE_RATE)]
+
+                started = time.perf_counter()
+                improved = run_pass(escalation_model, clip)
+                escalation_seconds += time.perf_counter() - started
+                escalated_seconds += end - start
+                escalation_windows += max(1, math.ceil((end - start) / WINDOW_SECONDS))
+                escalated_tokens += sum(len(s.get("tokens", ())) for s in improved["segments"])
+                for key, value in summarize_fallbacks(improved["segments"], temperatures).items():
+                    fallbacks[key] += value
+
+                for segment in improved["segments"]:
+                    segment["start"] += start
+                    segment["end"] += start
+                    for word in segment.get("words", []):
+                        word["start"] += start
+                        word["end"] += start
+                    segment["escalated"] = True
+                    merged.append(segment)
+                cursor = last + 1
+            merged.extend(segments[cursor:])
+
+        for i, segment in enumerate(merged):
+            segment["id"] = i
+        result["segments"] = merged
+        result["text"] = "".join(segment["text"] for segment in merged)
+
+    # Estimate what running the escalation model throughout would have cost.
+    # Short clips are padded to a full window, so its time is not scaled by
+    # audio duration: the encoder cost is extrapolated per 30-second window and
+    # the decoder cost per token, using the final transcript's token count.
+    large_seconds = None
+    speedup = None
+    if escalation_windows:
+        decoder_seconds = max(0.0, escalation_seconds - encoder_time["seconds"])
+        total_tokens = sum(len(s.get("tokens", ())) for s in result["segments"])
+        large_seconds = encoder_time["seconds"] / escalation_windows * max(
+            1, math.ceil(audio_seconds / WINDOW_SECONDS)
+        )
+        if escalated_tokens:
+            large_seconds += decoder_seconds / escalated_tokens * total_tokens
+        speedup = large_seconds / (fast_seconds + escalation_seconds)
+
+    result["cascade"] = {
+        "escalated_segments": sum(flagged),
+        "escalated_spans": len(spans),
+        "escalated_seconds": escalated_seconds,
+        "audio_seconds": audio_seconds,
+        "escalated_fraction": escalated_seconds / audio_seconds if audio_seconds else 0.0,
+        "fast_seconds": fast_seconds,
+        "escalation_seconds": escalation_seconds,
+        "escalation_load_seconds": load_seconds,
+        "escalation_windows": escalation_windows,
+        "escalation_encoder_seconds": encoder_time["seconds"],
+        "estimated_large_seconds": large_seconds,
+        "estimated_speedup": speedup,
+    }
+    result["decode"] = {"profile": decode_profile, "options": decode_options, **fallbacks}
+    result["timing"] = {
+        "audio_source": audio_report["source"],
+        "decode_seconds": audio_report["decode_seconds"],
+        "inference_seconds": fast_seconds + escalation_seconds,
+        "audio_seconds": audio_seconds,
+    }
+    if guards:
+        guard_report(result, *guards)
+    return result
+
+
+def format_cascade_report(report: dict) -> str:
+    """Return a short human-readable summary of a cascade run."""
+    lines = [
+        f"Escalated {report['escalated_segments']} segment(s) in "
+        f"{report['escalated_spans']} span(s): "
+        f"{report['escalated_seconds']:.1f}s of {report['audio_seconds']:.1f}s "
+        f"({report['escalated_fraction']:.1%})",
+        f"Fast pass: {report['fast_seconds']:.1f}s, "
+        f"escalation pass: {report['escalation_seconds']:.1f}s",
+    ]
+    if report["estimated_speedup"] is not None:
+        lines.append(
+            f"Estimated speedup vs. escalation model throughout: "
+            f"{report['estimated_speedup']:.2f}x "
+            f"(~{report['estimated_large_seconds']:.1f}s)"
+        )
+    return "\n".join(lines)
+
+
+def _speaker_turns_text(segments: List[dict]) -> str:
+    """Join segments into one paragraph per speaker turn."""
+    paragraphs: List[List[str]] = []
+    speakers: List[str] = []
+    for segment in segments:
+        if not speakers or speakers[-1] != segment["speaker"]:
+            speakers.append(segment["speaker"])
+            paragraphs.append([])
+        paragraphs[-1].append(segment["text"].strip())
+    return "\n\n".join(
+        f"{speaker}: {' '.join(texts)}" for speaker, texts in zip(speakers, paragraphs)
+    )
+
+
+def build_transcription_output(
+    result: dict, format: str = "txt", reflow: Optional[dict] = None
+) -> str:
+    """
+    Return the transcription as a formatted string.
+
+    Segments flagged by the loop guard are left out of TXT, SRT and VTT, and
+    kept with their "hallucination" reason in JSON.
+
+    Args:
+        result: Transcription result
+        format: One of SUPPORTED_FORMATS
+        reflow: Subtitle limits (overrides for REFLOW_DEFAULTS, {} for the
+                defaults) to reflow SRT/VTT cues with; None keeps one cue per
+                Whisper segment
+    """
     format = format.lower()
     if format not in SUPPORTED_FORMATS:
         raise ValueError(f"Unsupported format: {format}")
 
+    segments = result["segments"]
+    has_speakers = bool(segments) and all("speaker" in s for s in segments)
+    if format != "json":
+        kept = [s for s in segments if "hallucination" not in s]
+        if len(kept) < len(segments):
+            segments = kept
+            result = {**result, "text": "".join(s["text"] for s in kept)}
+
     if format == "txt":
+        if has_speakers:
+            return _speaker_turns_text(segments)
         return result["text"].strip()
 
+    if format == "json":
+        keys = ("id", "start", "end", "text", "speaker", "hallucination")
+        return json.dumps(
+            {
+                "text": result["text"].strip(),
+                "language": result.get("language"),
+                "segments": [
+                    {k: (s[k].strip() if k == "text" else s[k]) for k in keys if k in s}
+                    for s in segments
+                ],
+            },
+            ensure_ascii=False,
+            indent=2,
+        ) + "\n"
+
+    if reflow is not None:
+        segments = reflow_subtitles(segments, reflow)
+
     if format == "srt":
         blocks = []
-        for i, segment in enumerate(result["segments"], start=1):
+        for i, segment in enumerate(segments, start=1):
             start = format_timestamp(segment["start"])
             end = format_timestamp(segment["end"])
             text = segment["text"].strip()
+            if has_speakers:
+                text = f"[{segment['speaker']}] {text}"
             blocks.append(f"{i}\n{start} --> {end}\n{text}\n")
         return "\n".join(blocks).strip() + "\n"
 
     # format == "vtt"
     lines = ["WEBVTT", ""]
-    for segment in result["segments"]:
+    for segment in segments:
         start = format_timestamp(segment["start"], always_include_hours=True)
         end = format_timestamp(segment["end"], always_include_hours=True)
         text = segment["text"].strip()
+        if has_speakers:
+            text = f"<v {segment['speaker']}>{text}"
         lines.append(f"{start} --> {end}\n{text}\n")
     return "\n".join(lines).strip() + "\n"
 
 
-def save_transcription(result: dict, output_file: str, format: str = "txt") -> None:
+def save_transcription(
+    result: dict, output_file: str, format: str = "txt", reflow: Optional[dict] = None
+) -> None:
     """Persist a transcription result to disk."""
-    content = build_transcription_output(result, format)
+    content = build_transcription_output(result, format, reflow)
     with open(output_file, "w", encoding="utf-8") as f:
         f.write(content)
 
@@ -127,9 +693,17 @@ def format_timestamp(seconds: float, always_include_hours: bool = False) -> str:
         return f"{minutes:02d}:{seconds_remainder:06.3f}"
 
 
+def parse_temperatures(value: str) -> Tuple[float, ...]:
+    """Parse a comma-separated temperature schedule for argparse."""
+    try:
+        return tuple(float(t) for t in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid temperature list: {value}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Convert audio to text using Whisper")
-    parser.add_argument("audio_file", help="Path to the audio file")
+    parser.add_argument("audio_file", nargs="?", help="Path to the audio file")
     parser.add_argument("-o", "--output", help="Output file path")
     parser.add_argument("-m", "--model", default="base", choices=SUPPORTED_MODELS,
                         help="Model size (default: base)")
@@ -138,29 +712,195 @@ def main():
                         help="Output format (default: txt)")
     parser.add_argument("-v", "--verbose", action="store_true",
                         help="Verbose output")
+    parser.add_argument("--cascade", choices=SUPPORTED_MODELS, metavar="MODEL",
+                        help="Re-transcribe low-confidence segments with a larger model")
+    parser.add_argument("--draft-model", choices=SUPPORTED_MODELS,
+                        help="Smaller model drafting tokens for speculative decoding")
+    parser.add_argument("--diarize", action="store_true",
+                        help="Label segments by speaker")
+    parser.add_argument("--num-speakers", type=int,
+                        help="Known number of speakers (default: estimate)")
+    parser.add_argument("--decode-profile", default=DEFAULT_DECODE_PROFILE,
+                        choices=list(DECODE_PROFILES),
+                        help=f"Decoding preset (default: {DEFAULT_DECODE_PROFILE})")
+    parser.add_argument("--beam-size", type=int,
+                        help="Beam size, overriding the profile (omit for greedy)")
+    parser.add_argument("--best-of", type=int,
+                        help="Candidates sampled at non-zero temperature")
+    parser.add_argument("--temperature", type=parse_temperatures,
+                        help="Comma-separated temperature fallback schedule, e.g. 0,0.4,0.8")
+    parser.add_argument("--condition-on-previous-text",
+                        action=argparse.BooleanOptionalAction, default=None,
+                        help="Prompt each window with the previous window's text")
+    parser.add_argument("--watch", nargs="+", metavar="DIR",
+                        help="Watch directories and transcribe new audio files")
+    parser.add_argument("--output-dir",
+                        help="Directory for watch mode outputs (default: next to each file)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Watch mode worker processes, one model each (default: 1)")
+    parser.add_argument("--settle", type=float, default=5.0,
+                        help="Seconds a file must stop growing before watch mode picks it up")
+    parser.add_argument("--reflow", action="store_true",
+                        help="Reflow SRT/VTT cues to line-length and reading-speed limits")
+    parser.add_argument("--max-line-chars", type=int,
+                        help="Reflow: characters per line (default: 42)")
+    parser.add_argument("--max-lines", type=int,
+                        help="Reflow: lines per cue (default: 2)")
+    parser.add_argument("--max-cps", type=float,
+                        help="Reflow: reading speed in characters per second (default: 17)")
+    parser.add_argument("--loop-guard", action=argparse.BooleanOptionalAction, default=True,
+                        help="Cut repetition loops short and drop looping segments (default: on)")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_DIR, metavar="DIR",
+                        help="Profile the transcription (cProfile + torch operators) "
+                             f"and write the results to DIR (default: {PROFILE_DIR})")
+    parser.add_argument("--profile-top", type=int, default=20, metavar="N",
+                        help="Functions and operators listed in the profile summary")
+    parser.add_argument("--threads", type=int,
+                        help="Torch intra-op threads per process (default: all cores)")
+    parser.add_argument("--interop-threads", type=int,
+                        help="Torch inter-op threads per process")
+    parser.add_argument("--cpu-affinity", metavar="CPUS",
+                        help='CPUs to run on, e.g. "0-7"; split between watch workers')
+    parser.add_argument("--autotune", action="store_true", default=None,
+                        help="Calibrate the thread count on startup and remember it")
     
     args = parser.parse_args()
+    if bool(args.audio_file) == bool(args.watch):
+        parser.error("provide either an audio file or --watch DIR")
+    if args.cascade and args.diarize:
+        parser.error("--diarize cannot be combined with --cascade")
+    if args.cascade and SUPPORTED_MODELS.index(args.cascade) <= SUPPORTED_MODELS.index(args.model):
+        parser.error("--cascade must name a larger model than --model")
+    if args.watch and (args.cascade or args.draft_model or args.output):
+        parser.error("--watch cannot be combined with --cascade, --draft-model or --output")
+    if args.watch and args.profile:
+        parser.error("--profile profiles a single file and cannot be combined with --watch")
+    decode_overrides = {
+        "beam_size": args.beam_size,
+        "best_of": args.best_of,
+        "temperature": args.temperature,
+        "condition_on_previous_text": args.condition_on_previous_text,
+    }
+    reflow = None
+    if args.reflow:
+        reflow = {
+            key: value
+            for key, value in (
+                ("max_line_chars", args.max_line_chars),
+                ("max_lines", args.max_lines),
+                ("max_cps", args.max_cps),
+            )
+            if value is not None
+        }
+    runtime = runtime_config.runtime_settings(
+        args.threads, args.interop_threads, args.cpu_affinity, args.autotune
+    )
+
+    if args.watch:
+        from watch_folder import FolderWatcher
+
+        watcher = FolderWatcher(
+            args.watch,
+            model_size=args.model,
+            format=args.format,
+            output_dir=args.output_dir,
+            workers=args.workers,
+            settle=args.settle,
+            runtime=runtime,
+            reflow=reflow,
+            transcribe_options={
+                "language": args.language,
+                "decode_profile": args.decode_profile,
+                "decode_overrides": decode_overrides,
+                "diarize": args.diarize,
+                "num_speakers": args.num_speakers,
+                "loop_guard": args.loop_guard,
+                "word_timestamps": args.reflow,
+            },
+        )
+        try:
+            watcher.run()
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
     
     try:
+        runtime_config.apply_runtime_settings(runtime)
+
         # Load the model
-        model = load_whisper_model(args.model)
+        model = load_whisper_model(args.model, autotune=runtime["autotune"])
+        model = with_draft_model(model, args.model, args.draft_model)
         
+        profiler = None
+        if args.profile:
+            name = f"{os.path.splitext(os.path.basename(args.audio_file))[0]}-{int(time.time())}"
+            profiler = JobProfiler(args.profile, name, args.profile_top)
+
         # Transcribe the audio
-        result = transcribe_audio(model, args.audio_file, args.language, args.verbose)
+        with profiler or contextlib.nullcontext():
+            if args.cascade:
+                result = transcribe_cascade(
+                    model, args.audio_file, args.cascade, args.language, args.verbose,
+                    decode_profile=args.decode_profile, decode_overrides=decode_overrides,
+                    loop_guard=args.loop_guard, profiler=profiler,
+                )
+            else:
+                result = transcribe_audio(
+                    model, args.audio_file, args.language, args.verbose,
+                    decode_profile=args.decode_profile, decode_overrides=decode_overrides,
+                    diarize=args.diarize, num_speakers=args.num_speakers,
+                    loop_guard=args.loop_guard, word_timestamps=args.reflow,
+                    profiler=profiler,
+                )
         
         # Print result to console
         print("\nTranscription:")
         print(result["text"])
+
+        print("\nDecoding:")
+        print(format_decode_report(result["decode"]))
+
+        if "timing" in result:
+            print("\nTiming:")
+            print(format_timing_report(result["timing"]))
+
+        if "guard" in result:
+            print("\nLoop guard:")
+            print(format_guard_report(result["guard"]))
+
+        if profiler is not None and profiler.summary is not None:
+            print("\nProfile:")
+            print(format_profile_summary(profiler.summary))
+
+        if "diarization" in result:
+            report = result["diarization"]
+            print(
+                f"\nDiarization: {report['speakers']} speaker(s), "
+                + ("cached" if report["cached"] else
+                   f"{report['cpu_seconds']:.1f}s CPU / {report['wall_seconds']:.1f}s wall")
+            )
+
+        if "cascade" in result:
+            print("\nCascade:")
+            print(format_cascade_report(result["cascade"]))
+
+        if isinstance(model, SpeculativeWhisper):
+            print(
+                f"\nSpeculative decoding: {model.stats['accepted']}/"
+                f"{model.stats['drafted']} drafted tokens accepted "
+                f"({acceptance_rate(model.stats):.0%})"
+            )
         
         # Save to file if output path provided
         if args.output:
-            save_transcription(result, args.output, args.format)
+            save_transcription(result, args.output, args.format, reflow)
             print(f"\nTranscription saved to {args.output}")
         else:
             # Generate output filename based on input
             base_name = os.path.splitext(args.audio_file)[0]
             output_file = f"{base_name}.{args.format}"
-            save_transcription(result, output_file, args.format)
+            save_transcription(result, output_file, args.format, reflow)
             print(f"\nTranscription saved to {output_file}")
             
     except Exception as e: